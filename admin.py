@@ -1,25 +1,46 @@
 from sqladmin import Admin, ModelView
 from sqladmin.authentication import AuthenticationBackend
+from starlette.exceptions import HTTPException
+from starlette.applications import Starlette
 from starlette.requests import Request
 from models import User, Flashcard
 from database import engine, SessionLocal
-from auth import authenticate_user, create_access_token
-from jose import jwt
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from auth import (
+    authenticate_user, create_access_token, create_refresh_token, get_user_from_token,
+    get_user_from_refresh_token, invalidate_user,
+)
+from stats import reset_stats
+from versions import bump_collection_version, record_deletion
+from fragments import invalidate_card, invalidate_user_fragments
+from ratelimit import check_login, retry_after_header
+from tokens import TokenExpired
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 class AdminAuth(AuthenticationBackend):
     async def login(self, request: Request) -> bool:
         form = await request.form()
         username = form["username"]
         password = form["password"]
+
+        retry_after = await check_login(request, username)
+        if retry_after:
+            raise HTTPException(
+                status_code=429, detail="Слишком много попыток входа", headers=retry_after_header(retry_after)
+            )
         
         async with SessionLocal() as db:
             user = await authenticate_user(db, username, password)
             if user and user.is_superuser:
                 token = create_access_token({"sub": user.username})
-                request.session.update({"token": f"Bearer {token}"})
+                request.session.update({
+                    "token": f"Bearer {token}",
+                    "refresh_token": create_refresh_token({"sub": user.username}),
+                })
                 return True
         return False
 
@@ -34,23 +55,28 @@ class AdminAuth(AuthenticationBackend):
         
         try:
             clean_token = token.split(" ")[1] if " " in token else token
-            from auth import SECRET_KEY, ALGORITHM
-            payload = jwt.decode(clean_token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                return False
-            
-            async with SessionLocal() as db:
-                result = await db.execute(select(User).where(User.username == username))
-                user = result.scalars().first()
-                if user and user.is_superuser:
-                    request.state.user = user
-                    return True
+            try:
+                user = await get_user_from_token(clean_token)
+            except TokenExpired:
+                user = await self.refresh(request)
+            if user and user.is_superuser:
+                request.state.user = user
+                return True
             return False
         except Exception as e:
-            print(f"Ошибка аутентификации админки: {str(e)}")
+            logger.info("Ошибка аутентификации админки: %s", e, extra={"sample_key": "admin_auth"})
             return False
 
+    async def refresh(self, request: Request):
+        """Продлевает сессию админки по refresh-токену, не спрашивая пароль заново."""
+        refresh_token = request.session.get("refresh_token")
+        if not refresh_token:
+            return None
+        user = await get_user_from_refresh_token(refresh_token)
+        if user is not None:
+            request.session["token"] = f"Bearer {create_access_token({'sub': user.username})}"
+        return user
+
 class UserAdmin(ModelView, model=User):
     column_list = [User.id, User.username, User.is_superuser]
     column_details_list = [User.id, User.username, User.is_superuser]
@@ -61,9 +87,17 @@ class UserAdmin(ModelView, model=User):
     name = "Пользователь"
     name_plural = "Пользователи"
 
+    async def after_model_change(self, data, model, is_created, request):
+        if not is_created:
+            invalidate_user(model.id)
+
+    async def after_model_delete(self, model, request):
+        invalidate_user(model.id)
+        invalidate_user_fragments(model.id)
+
 class FlashcardAdmin(ModelView, model=Flashcard):
     column_list = [Flashcard.id, Flashcard.foreign_word, Flashcard.native_word, Flashcard.is_learned]
-    column_details_list = [Flashcard.id, Flashcard.foreign_word, Flashcard.native_word, Flashcard.example, Flashcard.is_learned, Flashcard.repetitions, Flashcard.last_reviewed, Flashcard.owner]
+    column_details_list = [Flashcard.id, Flashcard.foreign_word, Flashcard.native_word, Flashcard.example, Flashcard.is_learned, Flashcard.repetitions, Flashcard.last_reviewed, Flashcard.due_at, Flashcard.owner]
     column_searchable_list = [Flashcard.foreign_word, Flashcard.native_word]
     can_create = True
     can_edit = True
@@ -71,9 +105,52 @@ class FlashcardAdmin(ModelView, model=Flashcard):
     name = "Карточка"
     name_plural = "Карточки"
 
-def setup_admin(app):
+    # Владелец подтягивается JOIN-ом в том же запросе, а не отдельным запросом на строку
+    def list_query(self, request: Request):
+        return select(Flashcard).options(joinedload(Flashcard.owner))
+
+    def details_query(self, request: Request):
+        return self.form_edit_query(request)
+
+    def form_edit_query(self, request: Request):
+        return self._stmt_by_identifier(request.path_params["pk"]).options(joinedload(Flashcard.owner))
+
+    async def on_model_change(self, data, model, is_created, request):
+        # Здесь у модели ещё прежние значения: запоминаем владельца до правки
+        request.state.previous_owner_id = None if is_created else model.owner_id
+
+    async def after_model_change(self, data, model, is_created, request):
+        # Админка меняет карточки в обход обработчиков, поэтому счётчики пересчитываются заново
+        previous_owner_id = getattr(request.state, "previous_owner_id", None)
+        async with SessionLocal() as db:
+            if previous_owner_id is not None and previous_owner_id != model.owner_id:
+                # У прежнего владельца карточка пропала — для его клиентов это удаление
+                await reset_stats(db, previous_owner_id)
+                await record_deletion(db, model, owner_id=previous_owner_id)
+                invalidate_card(previous_owner_id, model.id)
+            if model.owner_id is not None:
+                await reset_stats(db, model.owner_id)
+                change_seq = await bump_collection_version(db, model.owner_id)
+                await db.execute(
+                    update(Flashcard).where(Flashcard.id == model.id).values(change_seq=change_seq)
+                )
+            await db.commit()
+
+    async def after_model_delete(self, model, request):
+        if model.owner_id is None:
+            return
+        async with SessionLocal() as db:
+            await reset_stats(db, model.owner_id)
+            await record_deletion(db, model)
+            await db.commit()
+        invalidate_card(model.owner_id, model.id)
+
+def build_admin() -> Admin:
+    """Админка как отдельное Starlette-приложение (admin.admin); в основное приложение
+    её монтирует main.LazyAdmin при первом запросе к /admin."""
     authentication_backend = AdminAuth(secret_key=os.getenv("SECRET_KEY", "your-secret-key"))
-    admin = Admin(app, engine, authentication_backend=authentication_backend, title="Админка Словаря")
+    # sqladmin монтирует себя в переданное приложение — отдаём ему пустое
+    admin = Admin(Starlette(), engine, authentication_backend=authentication_backend, title="Админка Словаря")
     admin.add_view(UserAdmin)
     admin.add_view(FlashcardAdmin)
     return admin
\ No newline at end of file
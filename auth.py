@@ -1,52 +1,123 @@
-from passlib.context import CryptContext
-from jose import jwt
-from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database import SessionLocal
+from database import SessionLocal, get_db
 from models import User
+from cache import TTLCache
+from invalidation import invalidations
+from passwords import get_pwd_context, password_hasher, PASSWORD_REHASH
+from tokens import token_verifier, ACCESS_TOKEN_EXPIRE_MINUTES
 from typing import Optional
+import logging
+import os
+import time
 
-SECRET_KEY = "your-very-secret-jwt-key-change-in-production"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+# Кэш пользователей по (sub, exp) токена: защищённые страницы не ходят в БД на каждый запрос
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
+
+# Синхронные версии блокируют event loop, в обработчиках используйте password_hasher
 def verify_password(plain_password, hashed_password):
     if isinstance(plain_password, str) and len(plain_password) > 72:
         plain_password = plain_password[:72]
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     if isinstance(password, str) and len(password) > 72:
         password = password[:72]
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return token_verifier.issue(data, "access")
+
+def create_refresh_token(data: dict):
+    return token_verifier.issue(data, "refresh")
 
 async def get_user(db: AsyncSession, username: str) -> Optional[User]:
     result = await db.execute(select(User).where(User.username == username))
     return result.scalars().first()
 
+async def get_user_from_token(token: str, db: Optional[AsyncSession] = None) -> Optional[User]:
+    """Проверяет JWT и возвращает пользователя, по возможности из кэша.
+
+    Если сессия не передана, она открывается только при промахе кэша.
+    Ошибки проверки токена пробрасываются вызывающему коду.
+    """
+    payload = token_verifier.verify(token)
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+
+    exp = payload.get("exp")
+    key = (username, exp)
+    user = user_cache.get(key)
+    if user is not None:
+        return user
+
+    if db is None:
+        async with SessionLocal() as session:
+            user = await get_user(session, username)
+    else:
+        user = await get_user(db, username)
+        if user is not None:
+            # Отвязываем объект от сессии запроса, чтобы его можно было отдавать другим запросам
+            db.expunge(user)
+
+    if user is not None:
+        ttl = exp - time.time() if exp else None
+        user_cache.set(key, user, ttl=ttl)
+    return user
+
+async def get_user_from_refresh_token(token: str, db: Optional[AsyncSession] = None) -> Optional[User]:
+    """Проверяет refresh-токен и находит пользователя в БД (без кэша:
+    удалённый пользователь не должен продлевать сессию). Пароль не проверяется,
+    поэтому продление не стоит bcrypt."""
+    payload = token_verifier.verify(token, "refresh")
+    username = payload.get("sub")
+    if username is None:
+        return None
+    if db is None:
+        async with SessionLocal() as session:
+            return await get_user(session, username)
+    return await get_user(db, username)
+
+def issue_token_pair(user: User) -> dict:
+    return {
+        "access_token": create_access_token({"sub": user.username}),
+        "refresh_token": create_refresh_token({"sub": user.username}),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+@invalidations.handler("user")
+def _discard_user(user_id: int):
+    user_cache.discard_where(lambda key, user: user.id == user_id)
+
+def invalidate_user(user_id: int):
+    """Сбрасывает закэшированные записи пользователя (после изменения или удаления) во всех воркерах."""
+    invalidations.publish("user", user_id)
+
 async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     user = await get_user(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not verified:
         return None
+    if PASSWORD_REHASH and new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(SessionLocal)
+    db: AsyncSession = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,48 +128,11 @@ async def get_current_user(
         if token.startswith("Bearer "):
             token = token[7:]
             
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        user = await get_user_from_token(token, db)
     except Exception as e:
-        print(f"Ошибка декодирования токена: {str(e)}")
+        logger.info("Ошибка декодирования токена: %s", e, extra={"sample_key": "token_decode"})
         raise credentials_exception
     
-    user = await get_user(db, username)
     if user is None:
         raise credentials_exception
     return user
-
-async def get_current_user_from_cookie(
-    request,
-    db: AsyncSession = Depends(SessionLocal)
-):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Не авторизован",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    access_token = request.cookies.get("access_token")
-    if not access_token:
-        raise credentials_exception
-    
-    if access_token.startswith("Bearer "):
-        token = access_token[7:]
-    else:
-        token = access_token
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except Exception as e:
-        print(f"Ошибка декодирования токена из куки: {str(e)}")
-        raise credentials_exception
-    
-    user = await get_user(db, username)
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
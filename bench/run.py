@@ -0,0 +1,316 @@
+"""Нагрузочный бенчмарк веб- и API-маршрутов.
+
+Создаёт временную базу (SQLite по умолчанию или указанную через
+--database-url, например PostgreSQL), заполняет её пользователями и
+карточками и гоняет сценарии конкурентными ASGI-клиентами прямо по
+приложению, без сети. Для каждого сценария считаются p50/p95/p99,
+пропускная способность и число SQL-запросов на HTTP-запрос; результат
+пишется в JSON, чтобы прогоны можно было сравнивать (--compare).
+
+    python -m bench.run --users 20 --cards 500 --requests 300 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_PASSWORD = "Password1"
+
+SCENARIOS = [
+    "web_login",
+    "dashboard",
+    "web_create",
+    "api_list",
+    "api_get",
+    "api_create",
+    "api_update",
+    "api_due",
+    "api_search",
+    "api_stats",
+    "api_changes",
+]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="Сколько пользователей создать")
+    parser.add_argument("--cards", type=int, default=500, help="Сколько карточек у каждого пользователя")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=10, help="Одновременных клиентов")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую")
+    parser.add_argument("--database-url", help="Готовая пустая база вместо временной SQLite (таблицы удаляются после прогона)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Куда сохранить JSON (по умолчанию bench/results/<время>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    return parser.parse_args(argv)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def seed(users: int, cards: int):
+    """Заполняет базу напрямую, минуя bcrypt и обработчики; возвращает [(id, username, [card ids])]."""
+    from sqlalchemy import insert, select
+    from database import SessionLocal
+    from models import Flashcard, User
+    from passwords import password_hasher
+    from versions import bump_collection_version
+
+    hashed = await password_hasher.hash(BENCH_PASSWORD)
+    seeded = []
+    async with SessionLocal() as db:
+        for i in range(users):
+            username = f"bench_user_{i}"
+            user_id = (await db.execute(
+                insert(User).values(username=username, hashed_password=hashed).returning(User.id)
+            )).scalar_one()
+            last_seq = await bump_collection_version(db, user_id, count=cards) if cards else 0
+            rows = [
+                {
+                    "foreign_word": f"word{n}",
+                    "native_word": f"слово{n}",
+                    "example": f"example sentence {n}" if n % 3 == 0 else None,
+                    "owner_id": user_id,
+                    "change_seq": last_seq - cards + 1 + n,
+                }
+                for n in range(cards)
+            ]
+            if rows:
+                await db.execute(insert(Flashcard), rows)
+            card_ids = (await db.execute(
+                select(Flashcard.id).where(Flashcard.owner_id == user_id)
+            )).scalars().all()
+            seeded.append((user_id, username, list(card_ids)))
+        await db.commit()
+    return seeded
+
+
+def build_requests(client, seeded, rng):
+    """Сценарий -> функция, которая отправляет один запрос от случайного пользователя.
+
+    Куки передаются заголовком, а не через общий cookie jar клиента:
+    иначе вход одного виртуального пользователя подменил бы сессию другим.
+    """
+    from auth import create_access_token
+
+    tokens = {username: create_access_token({"sub": username}) for _, username, _ in seeded}
+
+    def pick():
+        _, username, card_ids = rng.choice(seeded)
+        token = tokens[username]
+        return username, card_ids, {"Authorization": f"Bearer {token}"}, {"Cookie": f'access_token="Bearer {token}"'}
+
+    def word():
+        return f"bench{rng.randrange(10 ** 9)}"
+
+    async def web_login():
+        username, _, _, _ = pick()
+        return await client.post("/web/login", data={"username": username, "password": BENCH_PASSWORD})
+
+    async def dashboard():
+        _, _, _, cookie = pick()
+        return await client.get("/dashboard", headers=cookie)
+
+    async def web_create():
+        _, _, _, cookie = pick()
+        return await client.post(
+            "/web/flashcards", data={"foreign_word": word(), "native_word": word()}, headers=cookie
+        )
+
+    async def api_list():
+        _, _, headers, _ = pick()
+        return await client.get("/api/v1/flashcards/", headers=headers)
+
+    async def api_get():
+        _, card_ids, headers, _ = pick()
+        return await client.get(f"/api/v1/flashcards/{rng.choice(card_ids)}", headers=headers)
+
+    async def api_create():
+        _, _, headers, _ = pick()
+        return await client.post(
+            "/api/v1/flashcards/", json={"foreign_word": word(), "native_word": word()}, headers=headers
+        )
+
+    async def api_update():
+        _, card_ids, headers, _ = pick()
+        return await client.put(
+            f"/api/v1/flashcards/{rng.choice(card_ids)}", json={"native_word": word()}, headers=headers
+        )
+
+    async def api_due():
+        _, _, headers, _ = pick()
+        return await client.get("/api/v1/flashcards/due", headers=headers)
+
+    async def api_search():
+        _, _, headers, _ = pick()
+        return await client.get("/api/v1/flashcards/search", params={"q": f"word{rng.randrange(100)}"}, headers=headers)
+
+    async def api_stats():
+        _, _, headers, _ = pick()
+        return await client.get("/api/v1/flashcards/stats", headers=headers)
+
+    async def api_changes():
+        _, _, headers, _ = pick()
+        return await client.get("/api/v1/flashcards/changes", params={"limit": 100}, headers=headers)
+
+    return {name: func for name, func in locals().items() if name in SCENARIOS}
+
+
+async def run_scenario(send, total: int, concurrency: int):
+    from instrumentation import count_queries
+
+    latencies, queries, duplicates, errors = [], [], [], 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            # Каждый воркер — отдельная задача, поэтому счётчик у каждого запроса свой
+            with count_queries(strict=False) as stats:
+                started = time.perf_counter()
+                try:
+                    response = await send()
+                    if response.status_code >= 400:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                finally:
+                    latencies.append(time.perf_counter() - started)
+            queries.append(stats.count)
+            duplicates.append(sum(count - 1 for count in stats.duplicates().values()))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "throughput_rps": round(total / elapsed, 1),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+        "max_queries": max(queries),
+        "duplicate_queries_per_request": round(statistics.fmean(duplicates), 2),
+    }
+
+
+async def run(args):
+    import httpx
+    import main
+    from database import Base, engine
+
+    await main.startup()
+    try:
+        seeded = await seed(args.users, args.cards)
+        rng = random.Random(args.seed)
+        transport = httpx.ASGITransport(app=main.app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", follow_redirects=False) as client:
+            requests = build_requests(client, seeded, rng)
+            for name in args.scenarios.split(","):
+                name = name.strip()
+                if name not in requests:
+                    raise SystemExit(f"Неизвестный сценарий: {name}")
+                results[name] = await run_scenario(requests[name], args.requests, args.concurrency)
+                print_row(name, results[name])
+        if args.database_url:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+    finally:
+        await main.shutdown()
+    return results
+
+
+def print_row(name, result, baseline=None):
+    line = (
+        f"{name:<14} p50 {result['p50_ms']:>8.2f} мс  p95 {result['p95_ms']:>8.2f} мс  "
+        f"p99 {result['p99_ms']:>8.2f} мс  {result['throughput_rps']:>8.1f} rps  "
+        f"{result['queries_per_request']:>5.2f} SQL/запрос"
+    )
+    if result.get("duplicate_queries_per_request"):
+        line += f"  повторов: {result['duplicate_queries_per_request']:.2f}"
+    if result["errors"]:
+        line += f"  ошибок: {result['errors']}"
+    if baseline:
+        delta = (result["p95_ms"] - baseline["p95_ms"]) / baseline["p95_ms"] * 100 if baseline["p95_ms"] else 0.0
+        line += f"  (p95 {delta:+.1f}% к прошлому прогону)"
+    print(line)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    temp_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix="bench-")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{temp_dir.name}/bench.db"
+    os.environ["DATABASE_READ_URL"] = os.environ["DATABASE_URL"]
+    # Все виртуальные клиенты приходят с одного адреса — ограничение входа их бы отсекло
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    # Приложение открывает templates/ и static/ относительным путём
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "database": "sqlite (временная)" if temp_dir else args.database_url.split("://")[0],
+            "users": args.users,
+            "cards_per_user": args.cards,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "scenarios": results,
+    }
+    output = Path(args.output) if args.output else (
+        ROOT / "bench" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nРезультаты сохранены в {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["scenarios"]
+        print(f"\nСравнение с {args.compare}:")
+        for name, result in results.items():
+            print_row(name, result, baseline.get(name))
+
+
+if __name__ == "__main__":
+    main()
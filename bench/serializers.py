@@ -0,0 +1,80 @@
+"""Микробенчмарк сериализации ответа: response_model + jsonable_encoder против attrgetter + ORJSONResponse.
+
+Без базы и HTTP — только стоимость превращения страницы ORM-объектов
+в тело ответа, которую платит каждый список карточек. Первый вариант
+повторяет путь FastAPI с response_model (валидация from_attributes,
+jsonable_encoder, JSONResponse), второй — то, что делают обработчики
+сейчас (serialize_many и ORJSONResponse).
+
+    python -m bench.serializers --cards 100 --iterations 2000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=100, help="Карточек в одном ответе")
+    parser.add_argument("--iterations", type=int, default=2000, help="Ответов на вариант")
+    return parser.parse_args(argv)
+
+
+def measure(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(ROOT))
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from models import Flashcard
+    from schemas import FlashcardOut, FlashcardScheduleOut
+    from serializers import flashcard_to_dict, flashcard_schedule_to_dict, serialize_many
+
+    now = datetime.utcnow()
+    cards = [
+        Flashcard(
+            id=i, owner_id=1, foreign_word=f"word{i}", native_word=f"слово {i}",
+            example=f"Пример использования слова word{i} в предложении" if i % 2 else None,
+            is_learned=bool(i % 3), repetitions=i % 7, ease_factor=2.5, interval_days=i % 30,
+            due_at=now + timedelta(days=i % 30), last_reviewed=now,
+        )
+        for i in range(args.cards)
+    ]
+
+    def encoder(schema):
+        return lambda: JSONResponse(jsonable_encoder([schema.model_validate(card) for card in cards])).body
+
+    def attrgetter_orjson(serializer):
+        return lambda: ORJSONResponse(serialize_many(serializer, cards)).body
+
+    # Оба варианта должны отдавать одно и то же
+    for schema, serializer in ((FlashcardOut, flashcard_to_dict), (FlashcardScheduleOut, flashcard_schedule_to_dict)):
+        assert json.loads(encoder(schema)()) == json.loads(attrgetter_orjson(serializer)())
+
+    for title, schema, serializer in (
+        ("FlashcardOut (список)", FlashcardOut, flashcard_to_dict),
+        ("FlashcardScheduleOut (повторения)", FlashcardScheduleOut, flashcard_schedule_to_dict),
+    ):
+        results = {
+            "jsonable_encoder": measure(encoder(schema), args.iterations),
+            "attrgetter+orjson": measure(attrgetter_orjson(serializer), args.iterations),
+        }
+        baseline = results["jsonable_encoder"]
+        print(f"{title}, {args.cards} карточек в ответе:")
+        for name, seconds in results.items():
+            print(f"  {name:<20} {seconds * 1e6:>9.1f} мкс/ответ  x{baseline / seconds:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
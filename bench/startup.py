@@ -0,0 +1,120 @@
+"""Холодный старт: время импорта, инициализации и первых запросов.
+
+Каждый замер — в новом процессе интерпретатора: import main (с разбивкой
+по модулям из python -X importtime), startup() на пустой базе, первый
+запрос к / и к /admin/login (первое обращение к админке её настраивает).
+
+    python -m bench.startup --runs 5 --top 15
+    python -m bench.startup --budget-ms 1500    # код выхода 1, если import main дольше
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Выполняется в отдельном процессе: печатает JSON с длительностями этапов в мс
+PHASES_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    client.get("/")
+    first = time.perf_counter()
+    client.get("/admin/login")
+    admin = time.perf_counter()
+print(json.dumps({
+    "import main": (imported - started) * 1000,
+    "startup": (ready - imported) * 1000,
+    "первый GET /": (first - ready) * 1000,
+    "первый GET /admin/login": (admin - first) * 1000,
+}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Сколько раз запускать процесс")
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых дорогих модулей показать")
+    parser.add_argument("--budget-ms", type=float, help="Бюджет на import main (медиана), мс")
+    return parser.parse_args(argv)
+
+
+def child_env(database_dir: str) -> dict:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = env["DATABASE_READ_URL"] = f"sqlite+aiosqlite:///{database_dir}/startup.db"
+    env["LOG_LEVEL"] = "WARNING"
+    env.setdefault("RATE_LIMIT_ENABLED", "0")
+    return env
+
+
+def import_profile(env: dict) -> list:
+    """[(собственное время, суммарное время, модуль)] в мкс по выводу -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def measure_phases(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PHASES_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def top_level(name: str) -> str:
+    return name.strip().split(".")[0]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="startup-") as database_dir:
+        env = child_env(database_dir)
+        # Первый запуск прогревает .pyc и создаёт базу; в замеры не входит
+        measure_phases(env)
+        runs = [measure_phases(env) for _ in range(args.runs)]
+        profile = import_profile(env)
+
+    print(f"Этапы, медиана по {args.runs} запускам:")
+    for phase in runs[0]:
+        values = [run[phase] for run in runs]
+        print(f"  {phase:<26} {statistics.median(values):>8.1f} мс  (мин {min(values):.1f}, макс {max(values):.1f})")
+
+    packages = {}
+    for self_us, _, name in profile:
+        packages[top_level(name)] = packages.get(top_level(name), 0) + self_us
+    print(f"\nПакеты по собственному времени импорта (top {args.top}):")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<26} {self_us / 1000:>8.1f} мс")
+
+    print(f"\nМодули по суммарному времени импорта (top {args.top}):")
+    for _, cumulative_us, name in sorted(profile, key=lambda row: -row[1])[:args.top]:
+        print(f"  {name.strip():<40} {cumulative_us / 1000:>8.1f} мс")
+
+    import_ms = statistics.median(run["import main"] for run in runs)
+    if args.budget_ms is not None:
+        if import_ms > args.budget_ms:
+            print(f"\n✗ import main {import_ms:.1f} мс > бюджета {args.budget_ms:.0f} мс")
+            sys.exit(1)
+        print(f"\n✓ import main {import_ms:.1f} мс в пределах бюджета {args.budget_ms:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
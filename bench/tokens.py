@@ -0,0 +1,59 @@
+"""Микробенчмарк проверки JWT: jwt.decode на каждый запрос против TokenVerifier с кэшем.
+
+Без базы и HTTP — только стоимость проверки токена, которую платит
+каждый защищённый запрос. Набор токенов крутится по кругу, как при
+нескольких активных пользователях.
+
+    python -m bench.tokens --tokens 100 --iterations 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=100, help="Сколько разных токенов проверять по кругу")
+    parser.add_argument("--iterations", type=int, default=20000, help="Проверок на вариант")
+    return parser.parse_args(argv)
+
+
+def measure(func, tokens, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / iterations
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(ROOT))
+    from jose import jwt
+    from tokens import TokenVerifier, ALGORITHM
+
+    keys = {"bench": "bench-secret"}
+    verifier = TokenVerifier(keys, cache_size=max(args.tokens, 1))
+    tokens = [verifier.issue({"sub": f"bench_user_{i}"}) for i in range(args.tokens)]
+
+    def raw(token):
+        return jwt.decode(token, keys["bench"], algorithms=[ALGORITHM])
+
+    def uncached(token):
+        return verifier._decode(token)
+
+    results = {
+        "jwt.decode": measure(raw, tokens, args.iterations),
+        "verifier без кэша": measure(uncached, tokens, args.iterations),
+        "verifier с кэшем": measure(verifier.verify, tokens, args.iterations),
+    }
+    baseline = results["jwt.decode"]
+    for name, seconds in results.items():
+        print(f"{name:<20} {seconds * 1e6:>9.2f} мкс/проверка  x{baseline / seconds:>7.1f}")
+    print(f"попаданий в кэш: {verifier.cache.hits}, промахов: {verifier.cache.misses}")
+
+
+if __name__ == "__main__":
+    main()
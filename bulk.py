@@ -0,0 +1,189 @@
+import codecs
+import csv
+import io
+import json
+from collections import deque
+from typing import Optional
+
+BULK_BATCH_SIZE = 500
+# Сколько ошибок по строкам возвращать в ответе (счётчик failed учитывает все)
+BULK_MAX_ERRORS = 1000
+# Предел одной записи CSV (поле в кавычках с переводами строк)
+BULK_MAX_RECORD_LINES = 100
+BULK_MAX_RECORD_CHARS = 64 * 1024
+
+EXPORT_COLUMNS = [
+    "id", "foreign_word", "native_word", "example",
+    "is_learned", "repetitions", "last_reviewed", "created_at",
+]
+
+
+async def iter_lines(chunks):
+    """Режет поток байтов на строки, не загружая тело запроса целиком."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        tail += decoder.decode(chunk)
+        *lines, tail = tail.split("\n")
+        for line in lines:
+            yield line
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _in_quotes_after(line: str, in_quotes: bool) -> bool:
+    """Остаётся ли запись внутри поля в кавычках после строки line.
+
+    Кавычка открывает поле только в его начале, как у csv.reader:
+    в 5" screen,x она просто символ. "" внутри поля — экранированная кавычка.
+    """
+    if not in_quotes and '"' not in line:
+        return False
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 2
+                    continue
+                in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == ","
+        i += 1
+    return in_quotes
+
+
+def _starts_record(line: str, width: Optional[int]) -> bool:
+    """Строка сама по себе — целая запись CSV с нужным числом полей."""
+    if not line.strip() or _in_quotes_after(line, False):
+        return False
+    try:
+        values = next(csv.reader([line]))
+    except csv.Error:
+        return False
+    return width is None or len(values) == width
+
+
+async def iter_csv_rows(lines):
+    """Возвращает (номер строки, dict | Exception). Первая строка — заголовок.
+
+    Поле в кавычках может содержать перевод строки, поэтому строки
+    склеиваются, пока открытое кавычкой поле не закрыто. Запись длиннее
+    BULK_MAX_RECORD_LINES строк или BULK_MAX_RECORD_CHARS символов (или
+    не закрытая до конца файла) — одна ошибка в её первой строке; разбор
+    продолжается с первой следующей строки (из поглощённых или дальше по
+    файлу), которая сама является записью с числом полей как в заголовке.
+    Строки до неё пропускаются, а не превращаются в отдельные ошибки.
+    """
+    header = None
+    source = aiter(lines)
+    # Строки отброшенной записи, с которых разбор продолжается
+    replay = deque()
+    record, size, in_quotes, line_no = [], 0, False, 0
+
+    # После отброшенной записи строки пропускаются до первой, которая сама — запись
+    skipping = False
+
+    def width():
+        return len(header) if header is not None else None
+
+    def resync(message):
+        nonlocal record, size, in_quotes, skipping
+        rest = record[1:]
+        start = next((i for i, (_, text) in enumerate(rest) if _starts_record(text, width())), None)
+        if start is None:
+            skipping = True
+        else:
+            replay.extendleft(reversed(rest[start:]))
+        first = record[0][0]
+        record, size, in_quotes = [], 0, False
+        return first, ValueError(message)
+
+    while True:
+        if replay:
+            number, line = replay.popleft()
+        else:
+            try:
+                line = await anext(source)
+            except StopAsyncIteration:
+                if not record:
+                    return
+                yield resync("Незакрытая кавычка")
+                continue
+            line_no += 1
+            number = line_no
+            # CRLF: \r остаётся в конце строки после разбиения по \n
+            line = line.removesuffix("\r")
+            if skipping:
+                if not _starts_record(line, width()):
+                    continue
+                skipping = False
+        record.append((number, line))
+        size += len(line)
+        in_quotes = _in_quotes_after(line, in_quotes)
+        if in_quotes:
+            if len(record) >= BULK_MAX_RECORD_LINES or size > BULK_MAX_RECORD_CHARS:
+                yield resync("Незакрытая кавычка: запись слишком длинная")
+            continue
+        record_line = record[0][0]
+        raw = "\n".join(text for _, text in record)
+        record, size = [], 0
+        if not raw.strip():
+            continue
+        try:
+            values = next(csv.reader([raw]))
+        except csv.Error as e:
+            yield record_line, e
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            if not {"foreign_word", "native_word"} <= set(header):
+                raise ValueError("В заголовке CSV нужны столбцы foreign_word и native_word")
+            continue
+        yield record_line, dict(zip(header, values))
+
+
+async def iter_ndjson_rows(lines):
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+            continue
+        if not isinstance(row, dict):
+            yield line_no, ValueError("Ожидался JSON-объект")
+            continue
+        yield line_no, row
+
+
+def _export_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def csv_chunk(rows, with_header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if with_header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_export_value(value) for value in row])
+    return buffer.getvalue()
+
+
+def ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=_export_value) + "\n"
+        for row in rows
+    )
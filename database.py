@@ -1,11 +1,239 @@
+import asyncio
+import logging
 import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from instrumentation import instrument_engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: без блокировки, там нет и fork-режима serve.py
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./dict.db")
+# Отдельный адрес для чтения (например, реплика PostgreSQL); по умолчанию та же база
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", DATABASE_URL)
+
+# Пул соединений; без значения берётся умолчание для конкретной СУБД
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")
+DB_MAX_OVERFLOW = os.getenv("DB_MAX_OVERFLOW")
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Файл межпроцессной блокировки для создания схемы и миграций; по умолчанию рядом с базой SQLite
+INIT_LOCK_FILE = os.getenv("INIT_LOCK_FILE")
+
+# Предупреждать, если соединение удерживается из пула дольше (мс)
+DB_CHECKOUT_WARN_MS = float(os.getenv("DB_CHECKOUT_WARN_MS", "1000"))
+
+# PRAGMA для SQLite: WAL не даёт писателям блокировать читателей
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Отрицательное значение — размер в КиБ (здесь 64 МиБ на соединение)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+
+# Умолчания (pool_size, max_overflow): SQLite всё равно пишет в один поток
+POOL_DEFAULTS = {
+    "sqlite": (5, 5),
+    "postgresql": (10, 20),
+}
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _sqlite_pragmas(readonly: bool):
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+    ]
+    if readonly:
+        pragmas.append("PRAGMA query_only = ON")
+    return pragmas
+
+
+def create_engine_from_url(database_url: str, readonly: bool = False, **kwargs):
+    """Создаёт движок с настройками пула и соединений под конкретную СУБД."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    options = {"echo": False}
+
+    if not _is_sqlite_memory(url):
+        pool_size, max_overflow = POOL_DEFAULTS.get(backend, (5, 10))
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=int(DB_POOL_SIZE or pool_size),
+            max_overflow=int(DB_MAX_OVERFLOW or max_overflow),
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    if backend == "sqlite":
+        options["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    else:
+        options["pool_pre_ping"] = True
+        if readonly and backend == "postgresql":
+            options["execution_options"] = {"postgresql_readonly": True}
+    options.update(kwargs)
+
+    engine = create_async_engine(database_url, **options)
+
+    if backend == "sqlite":
+        pragmas = _sqlite_pragmas(readonly)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    track_checkouts(engine)
+    instrument_engine(engine)
+    return engine
+
+
+# Статистика пула по всем движкам процесса
+pool_stats = {
+    "checkouts": 0,
+    "checked_out": 0,
+    "held_seconds_total": 0.0,
+    "held_seconds_max": 0.0,
+    "slow_checkouts": 0,
+    "concurrent_checkouts": 0,
+    "acquire_seconds_total": 0.0,
+    "acquire_seconds_max": 0.0,
+}
+# Сколько соединений сейчас держит текущий запрос (заполняется в get_db)
+_request_connections: ContextVar = ContextVar("request_connections", default=None)
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий ожидание соединения (включая открытие нового, если пул не заполнен)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            pool_stats["acquire_seconds_total"] += waited
+            pool_stats["acquire_seconds_max"] = max(pool_stats["acquire_seconds_max"], waited)
+
+
+def track_checkouts(engine):
+    """Замеряет время удержания соединений и ловит запросы, взявшие второе соединение."""
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_at"] = time.perf_counter()
+        pool_stats["checkouts"] += 1
+        pool_stats["checked_out"] += 1
+        held = _request_connections.get()
+        if held is not None:
+            held[0] += 1
+            if held[0] > 1:
+                pool_stats["concurrent_checkouts"] += 1
+                logger.warning(
+                    "Запрос удерживает несколько соединений с БД одновременно",
+                    extra={"connections": held[0], "sample_key": "concurrent_checkout"}
+                )
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checkout_at", None)
+        if started is None:
+            return
+        held_seconds = time.perf_counter() - started
+        pool_stats["checked_out"] -= 1
+        pool_stats["held_seconds_total"] += held_seconds
+        pool_stats["held_seconds_max"] = max(pool_stats["held_seconds_max"], held_seconds)
+        if held_seconds * 1000 > DB_CHECKOUT_WARN_MS:
+            pool_stats["slow_checkouts"] += 1
+            logger.warning(
+                "Соединение с БД удерживалось слишком долго",
+                extra={"held_ms": round(held_seconds * 1000), "sample_key": "slow_checkout"}
+            )
+        held = _request_connections.get()
+        if held is not None and held[0] > 0:
+            held[0] -= 1
+
+
+engine = create_engine_from_url(DATABASE_URL)
 SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-Base = declarative_base()
\ No newline at end of file
+# Движок только для чтения — для GET-запросов. In-memory SQLite существует
+# в единственном соединении, поэтому там читаем через основной движок.
+if _is_sqlite_memory(make_url(DATABASE_READ_URL)):
+    read_engine = engine
+else:
+    read_engine = create_engine_from_url(DATABASE_READ_URL, readonly=True)
+ReadSessionLocal = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def get_db(request: Request):
+    """Сессия на время запроса.
+
+    Одна и та же сессия достаётся и зависимостям аутентификации, и обработчику
+    (FastAPI кэширует зависимость в пределах запроса), и закрывается сразу
+    после ответа. GET/HEAD идут через движок только для чтения.
+    """
+    session_factory = ReadSessionLocal if request.method in ("GET", "HEAD") else SessionLocal
+    # Счётчик живёт в контексте задачи запроса и исчезает вместе с ней
+    _request_connections.set([0])
+    async with session_factory() as session:
+        yield session
+
+
+def upsert(db: AsyncSession, model):
+    """insert() диалекта сессии — с on_conflict_do_update (INSERT ... ON CONFLICT есть и в SQLite, и в PostgreSQL)."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+Base = declarative_base()
+
+
+def init_lock_path() -> str:
+    """Файл блокировки инициализации: рядом с файлом SQLite или во временном каталоге."""
+    if INIT_LOCK_FILE:
+        return INIT_LOCK_FILE
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        return url.database + ".init.lock"
+    return os.path.join(tempfile.gettempdir(), "flashcards-init.lock")
+
+
+@asynccontextmanager
+async def init_lock():
+    """Межпроцессная блокировка на время создания схемы и миграций,
+    чтобы воркеры uvicorn --workers N не делали это наперегонки."""
+    if fcntl is None:
+        yield
+        return
+    with open(init_lock_path(), "a") as lock_file:
+        # flock блокирует поток, поэтому ждём его не в event loop
+        await asyncio.to_thread(fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
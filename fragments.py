@@ -0,0 +1,61 @@
+import os
+from markupsafe import Markup
+from cache import TTLCache
+from invalidation import invalidations
+
+# Кэш готового HTML карточек и блока статистики для дашборда
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "10000"))
+FRAGMENT_CACHE_TTL = float(os.getenv("FRAGMENT_CACHE_TTL", "3600"))
+
+# (user_id, card_id) -> (change_seq, html): в записи хранится версия карточки,
+# поэтому правка сразу делает запись непригодной, а на каждую карточку
+# приходится не больше одной записи
+card_fragments = TTLCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL)
+# user_id -> (версия коллекции, html)
+stats_fragments = TTLCache(maxsize=FRAGMENT_CACHE_SIZE // 10 or 1, ttl=FRAGMENT_CACHE_TTL)
+
+
+def render_card(template, user_id: int, card) -> Markup:
+    """HTML карточки по шаблону _flashcard.html; шаблон вычисляется только при смене версии."""
+    key = (user_id, card.id)
+    cached = card_fragments.get(key)
+    if cached is not None and cached[0] == card.change_seq:
+        return cached[1]
+    html = Markup(template.render(card=card))
+    card_fragments.set(key, (card.change_seq, html))
+    return html
+
+
+def render_cards(template, user_id: int, cards) -> Markup:
+    return Markup("").join(render_card(template, user_id, card) for card in cards)
+
+
+async def render_stats(template, user_id: int, version: int, load_stats) -> Markup:
+    """HTML блока статистики; load_stats (корутина без аргументов) вызывается
+    только при промахе, так что на попадании в кэш запроса к базе нет."""
+    cached = stats_fragments.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    html = Markup(template.render(stats=await load_stats()))
+    stats_fragments.set(user_id, (version, html))
+    return html
+
+
+@invalidations.handler("card_fragment")
+def _discard_card(user_id: int, card_id: int):
+    card_fragments.discard((user_id, card_id))
+
+
+@invalidations.handler("user_fragments")
+def _discard_user_fragments(user_id: int):
+    card_fragments.discard_where(lambda key, value: key[0] == user_id)
+    stats_fragments.discard(user_id)
+
+
+def invalidate_card(user_id: int, card_id: int):
+    """Вызывается при удалении карточки или её переходе к другому владельцу."""
+    invalidations.publish("card_fragment", user_id, card_id)
+
+
+def invalidate_user_fragments(user_id: int):
+    invalidations.publish("user_fragments", user_id)
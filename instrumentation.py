@@ -0,0 +1,166 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Запросы дольше порога (мс) печатаются вместе с текстом
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Бюджет SQL-запросов на HTTP-запрос; 0 — без ограничения
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "0"))
+# С SQL_QUERY_ASSERT=1 превышение бюджета роняет запрос (для тестов), иначе только предупреждение
+SQL_QUERY_ASSERT = os.getenv("SQL_QUERY_ASSERT", "0") == "1"
+
+
+class QueryCountExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """SQL-запросы одного HTTP-запроса (или блока count_queries)."""
+
+    __slots__ = ("count", "seconds", "statements", "budget", "strict")
+
+    def __init__(self, budget: int = 0, strict: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+        self.budget = budget
+        self.strict = strict
+
+    @property
+    def milliseconds(self) -> float:
+        return self.seconds * 1000
+
+    def duplicates(self):
+        """Одинаковые тексты запросов, выполненные больше одного раза — признак N+1."""
+        seen = {}
+        for statement in self.statements:
+            seen[statement] = seen.get(statement, 0) + 1
+        return {statement: count for statement, count in seen.items() if count > 1}
+
+
+_current_stats: ContextVar = ContextVar("query_stats", default=None)
+
+
+def current_query_stats():
+    return _current_stats.get()
+
+
+def instrument_engine(engine):
+    """Вешает на движок счётчик запросов и журнал медленных запросов."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.count += 1
+            if stats.budget and stats.count > stats.budget:
+                message = f"SQL-запросов больше бюджета ({stats.budget}): {statement}"
+                if stats.strict:
+                    raise QueryCountExceeded(message)
+                if stats.count == stats.budget + 1:
+                    logger.warning(message, extra={"sample_key": "query_budget"})
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed = time.perf_counter() - started
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.seconds += elapsed
+            stats.statements.append(statement)
+        if elapsed * 1000 > SLOW_QUERY_MS:
+            logger.warning(
+                "Медленный запрос",
+                extra={
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "statement": " ".join(statement.split()),
+                    "sample_key": "slow_query",
+                }
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        # Упавший запрос не доходит до after_cursor_execute
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+    return engine
+
+
+@contextmanager
+def count_queries(budget: int = 0, strict: bool = True):
+    """Считает запросы внутри блока; с budget и strict превышение бросает QueryCountExceeded.
+
+        with count_queries(budget=3) as stats:
+            await client.get("/api/v1/flashcards/")
+        assert not stats.duplicates()
+
+    Запросы HTTP-запроса считает QueryCountMiddleware и добавляет сюда после
+    ответа, поэтому бюджет блока проверяется ещё и при выходе из него.
+    Клиент должен работать в том же контексте (httpx.AsyncClient с
+    ASGITransport); TestClient выполняет приложение в другом потоке.
+    """
+    stats = QueryStats(budget, strict)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+    if strict and budget and stats.count > budget:
+        raise QueryCountExceeded(
+            f"SQL-запросов больше бюджета ({budget}): {stats.count}\n" + "\n".join(stats.statements)
+        )
+
+
+class QueryCountMiddleware:
+    """ASGI-middleware: считает SQL-запросы запроса и отдаёт их в заголовке Server-Timing.
+
+    Заголовок уходит вместе с началом ответа, поэтому запросы, выполненные
+    потоковым ответом уже после заголовков, в него не попадают.
+    TestClient выполняет приложение в другом потоке, и count_queries() из
+    теста туда не доходит — в таких тестах включайте SQL_QUERY_BUDGET и
+    SQL_QUERY_ASSERT=1 или разбирайте заголовок Server-Timing.
+    """
+
+    def __init__(self, app, budget: int = SQL_QUERY_BUDGET, strict: bool = SQL_QUERY_ASSERT):
+        self.app = app
+        self.budget = budget
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        outer = _current_stats.get()
+        stats = QueryStats(self.budget, self.strict)
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={stats.milliseconds:.1f};desc="{stats.count} queries", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            if outer is not None:
+                # Запрос внутри count_queries(): учитываем его и во внешнем счётчике
+                outer.count += stats.count
+                outer.seconds += stats.seconds
+                outer.statements.extend(stats.statements)
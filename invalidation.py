@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Включается serve.py при нескольких воркерах; в одном процессе канал не нужен
+CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "0") == "1"
+# Как часто воркер отправляет свои события и забирает чужие (секунды)
+INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "1"))
+# Сколько хранить события в таблице (секунды)
+INVALIDATION_RETENTION = float(os.getenv("INVALIDATION_RETENTION", "3600"))
+
+
+class InvalidationChannel:
+    """Сброс кэшей процесса во всех воркерах через таблицу cache_invalidations.
+
+    publish() сразу вызывает обработчик в своём процессе, а при включённом
+    канале ещё и ставит событие в очередь. Фоновая задача раз в
+    INVALIDATION_POLL_INTERVAL записывает очередь в таблицу и применяет чужие
+    события с id больше последнего прочитанного, так что остальные воркеры
+    отстают не больше чем на два интервала опроса. Если событие всё же потеряется
+    (например, PostgreSQL закоммитит меньший id позже большего), запись
+    доживёт только до своего TTL в кэше.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.pending = []
+        self.enabled = False
+        self.origin = None
+        self.last_id = 0
+        self._task = None
+
+    def handler(self, kind: str):
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def publish(self, kind: str, *args):
+        self.handlers[kind](*args)
+        if self.enabled:
+            self.pending.append((kind, args))
+
+    async def start(self, interval: float = INVALIDATION_POLL_INTERVAL):
+        from sqlalchemy import func, select
+        from database import SessionLocal
+        from models import CacheInvalidation
+
+        # Идентификатор создаётся после fork, у каждого воркера свой
+        self.origin = uuid.uuid4().hex
+        async with SessionLocal() as db:
+            self.last_id = (await db.execute(select(func.max(CacheInvalidation.id)))).scalar() or 0
+        self.enabled = True
+        self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.pending:
+            await self.sync()
+        self.enabled = False
+
+    async def _run(self, interval: float):
+        cycles = 0
+        while True:
+            await asyncio.sleep(interval)
+            cycles += 1
+            try:
+                # Старые события чистим примерно раз в минуту
+                await self.sync(cleanup=cycles % max(1, int(60 / interval)) == 0)
+            except Exception:
+                logger.exception("Ошибка синхронизации сброса кэшей", extra={"sample_key": "invalidation_sync"})
+
+    async def sync(self, cleanup: bool = False):
+        from sqlalchemy import delete, insert, select
+        from database import SessionLocal
+        from models import CacheInvalidation
+
+        pending, self.pending = self.pending, []
+        try:
+            async with SessionLocal() as db:
+                if pending:
+                    await db.execute(insert(CacheInvalidation), [
+                        {"origin": self.origin, "kind": kind, "payload": json.dumps(args)}
+                        for kind, args in pending
+                    ])
+                rows = (await db.execute(
+                    select(CacheInvalidation.id, CacheInvalidation.origin, CacheInvalidation.kind, CacheInvalidation.payload)
+                    .where(CacheInvalidation.id > self.last_id)
+                    .order_by(CacheInvalidation.id)
+                )).all()
+                if cleanup:
+                    cutoff = datetime.utcnow() - timedelta(seconds=INVALIDATION_RETENTION)
+                    await db.execute(delete(CacheInvalidation).where(CacheInvalidation.created_at < cutoff))
+                await db.commit()
+        except Exception:
+            # Неотправленные события попробуем отправить в следующий раз
+            self.pending[:0] = pending
+            raise
+
+        for row_id, origin, kind, payload in rows:
+            self.last_id = row_id
+            if origin == self.origin:
+                continue
+            handler = self.handlers.get(kind)
+            if handler is not None:
+                handler(*json.loads(payload))
+
+
+invalidations = InvalidationChannel()
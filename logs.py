@@ -0,0 +1,190 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json — одна строка JSON на событие, text — для чтения глазами при разработке
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Сэмплирование частых сообщений: за окно LOG_SAMPLE_WINDOW секунд по ключу
+# проходит не больше LOG_SAMPLE_BURST записей, остальные считаются и отбрасываются
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "10"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "10"))
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Сторонние логгеры, которые на INFO пишут по строке на каждый запрос или соединение
+# (пул SQLAlchemy называет логгер по модулю класса пула, отсюда database.TimedQueuePool)
+QUIET_LOGGERS = ("httpx", "httpcore", "sqlalchemy", "database.TimedQueuePool")
+
+_request_id: ContextVar = ContextVar("request_id", default=None)
+
+# Атрибуты, которые есть у любой записи; всё остальное — поля из extra
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает ограниченное число записей с одинаковым extra={"sample_key": ...} за окно.
+
+    Первая запись нового окна получает поле suppressed — сколько записей
+    было отброшено в предыдущем. Записи без sample_key проходят всегда.
+    """
+
+    def __init__(self, window: float = LOG_SAMPLE_WINDOW, burst: int = LOG_SAMPLE_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        # ключ -> [начало окна, пропущено в окне, отброшено в окне]
+        self.state = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        state = self.state.get(key)
+        if state is None or now - state[0] >= self.window:
+            suppressed = state[2] if state else 0
+            self.state[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if state[1] < self.burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key != "sample_key":
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Стандартный prepare форматирует запись (и traceback) прямо в вызывающем
+        # потоке; здесь только подставляются аргументы, остальное делает слушатель
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging():
+    """Настраивает корневой логгер: запись в очередь в вызывающем потоке,
+    форматирование и вывод — в фоновом потоке QueueListener."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if _handler is not None:
+        # Повторный запуск после stop_logging (например, новый startup в тестах)
+        root.removeHandler(_handler)
+    else:
+        atexit.register(stop_logging)
+    root.addHandler(handler)
+    _handler = handler
+    if LOG_LEVEL != "DEBUG":
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _reset_after_fork():
+    # Поток QueueListener не переживает fork: в дочернем процессе setup_logging запустит новый
+    global _listener
+    _listener = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class RequestIdMiddleware:
+    """Берёт X-Request-ID из запроса (или создаёт новый) и возвращает его в ответе."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = _request_id.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _request_id.reset(token)
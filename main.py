@@ -1,24 +1,62 @@
-from fastapi import FastAPI, Request, status, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import FastAPI, Request, status, Depends, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database import Base, engine, SessionLocal
+from database import Base, engine, read_engine, SessionLocal, get_db, init_lock
 from models import User, Flashcard
-from auth import get_current_user, authenticate_user, create_access_token, get_password_hash
+from auth import get_user_from_token, get_user_from_refresh_token, authenticate_user, create_access_token, create_refresh_token
+from tokens import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+from passwords import password_hasher
+from ratelimit import check_login, check_register, retry_after_header
+import logging
 import os
-from jose import jwt
-from datetime import datetime, timedelta
-from admin import setup_admin  
+import json
+from urllib.parse import quote, unquote
+from typing import Literal, Optional
+from pagination import SORT_COLUMNS, fetch_flashcards_page
+from stats import get_flashcard_stats, apply_stats_delta
+from versions import (
+    mark_changed, record_deletion, get_collection_version, make_etag,
+    is_not_modified, not_modified, set_validators,
+)
+from scheduler import schedule_review
+from search import setup_search
+from migrations import upgrade
+from instrumentation import QueryCountMiddleware
+from metrics import MetricsMiddleware, TimedTemplate, registry
+from templating import build_environments, sources_hash
+from logs import RequestIdMiddleware, setup_logging, stop_logging
+from fragments import render_card, render_cards, render_stats, invalidate_card
+from invalidation import invalidations, CACHE_INVALIDATION
+from routers import auth as auth_router, flashcards as flashcards_router
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-os.makedirs("templates", exist_ok=True)
-os.makedirs("static/css", exist_ok=True)
-os.makedirs("static/js", exist_ok=True)
+# Логи пишутся в очередь, в stdout их выводит фоновый поток
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Второе окружение — те же шаблоны для потокового рендера через generate_async.
+# Время рендера каждого шаблона попадает в /metrics; если есть compiled_templates/
+# (python templating.py), шаблоны загружаются уже скомпилированными
+sync_templates, streaming_templates = build_environments(template_class=TimedTemplate)
+templates = Jinja2Templates(env=sync_templates)
+# Входит в ETag страниц: после деплоя с новыми шаблонами старый HTML не отдаётся через 304
+TEMPLATES_VERSION = sources_hash()[:12]
+
+# 0 — схема уже создана заранее (serve.py делает это один раз до запуска воркеров)
+APP_INIT_DB = os.getenv("APP_INIT_DB", "1") == "1"
+# 0 — миграции применяются отдельно: python migrations.py upgrade
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
 
-templates = Jinja2Templates(directory="templates")
+# Необязательный токен для /metrics (Authorization: Bearer ...)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+# Сколько карточек читать из курсора за раз при потоковом рендере
+DASHBOARD_STREAM_BATCH = int(os.getenv("DASHBOARD_STREAM_BATCH", "200"))
 
 app = FastAPI(
     title="Словарь иностранных слов",
@@ -37,10 +75,52 @@ app = FastAPI(
     swagger_ui_parameters={"persistAuthorization": True}
 )
 
-admin = setup_admin(app)
+class LazyAdmin:
+    """/admin: sqladmin (с wtforms) импортируется и настраивается при первом запросе
+    к админке, а не при старте процесса. serve.py вызывает load() до fork."""
+
+    def __init__(self):
+        self.app = None
+
+    @property
+    def routes(self):
+        # Для request.url_for("admin:...") внутри админки
+        return self.app.routes if self.app is not None else []
+
+    def load(self):
+        if self.app is None:
+            from admin import build_admin
+
+            self.app = build_admin().admin
+        return self.app
+
+    async def __call__(self, scope, receive, send):
+        await self.load()(scope, receive, send)
+
+admin = LazyAdmin()
+app.mount("/admin", admin, name="admin")
+
+# Число и время SQL-запросов каждого запроса — в заголовке Server-Timing
+app.add_middleware(QueryCountMiddleware)
+# Задержки по маршрутам и запросы в обработке для /metrics (внешний слой — видит всё время ответа)
+app.add_middleware(MetricsMiddleware)
+# X-Request-ID в ответе и в каждой записи лога
+app.add_middleware(RequestIdMiddleware)
+
+# JSON API для клиентов
+API_PREFIX = "/api/v1"
+app.include_router(auth_router.router, prefix=API_PREFIX)
+app.include_router(flashcards_router.router, prefix=API_PREFIX)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Не авторизован")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get(
     "/",
     response_class=HTMLResponse,
@@ -51,7 +131,7 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-async def get_current_user_from_cookie(request: Request):
+async def get_current_user_from_cookie(request: Request, db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не авторизован",
@@ -68,30 +148,142 @@ async def get_current_user_from_cookie(request: Request):
         token = access_token
     
     try:
-        from auth import SECRET_KEY, ALGORITHM
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        
-        # Получаем пользователя из базы
-        async with SessionLocal() as db:
-            result = await db.execute(select(User).where(User.username == username))
-            user = result.scalars().first()
-            if user is None:
-                raise credentials_exception
-            return user
+        # Пользователь берётся из кэша, в базу идём только при промахе
+        user = await get_user_from_token(token, db)
     except Exception as e:
-        print(f"Ошибка аутентификации из куки: {str(e)}")
+        logger.info("Ошибка аутентификации из куки: %s", e, extra={"sample_key": "token_decode"})
         raise credentials_exception
 
+    if user is None:
+        raise credentials_exception
+    return user
+
+async def render_dashboard(
+    request: Request,
+    db: AsyncSession,
+    user: User,
+    after: Optional[str] = None,
+    sort: str = "id",
+    status_code: int = 200,
+    version: Optional[int] = None,
+    **context
+):
+    """Рендерит одну страницу дашборда: карточки страницы и статистику по всем карточкам.
+
+    Карточки и блок статистики берутся из кэша фрагментов, шаблон страницы
+    лишь склеивает готовый HTML.
+    """
+    flashcards, next_cursor = await fetch_flashcards_page(db, user.id, DASHBOARD_PAGE_SIZE, after, sort)
+    if version is None:
+        version = (await get_collection_version(db, user.id)).version
+    stats_html = await render_stats(
+        templates.get_template("_stats.html"), user.id, version, lambda: get_flashcard_stats(db, user.id)
+    )
+    card_template = templates.get_template("_flashcard.html")
+    return templates.TemplateResponse("dashboard.html", {
+        "request": request,
+        "user": user,
+        "flashcards": flashcards,
+        "cards_html": [render_card(card_template, user.id, card) for card in flashcards],
+        "stats_html": stats_html,
+        "next_cursor": next_cursor,
+        "after": after,
+        "sort": sort,
+        **context
+    }, status_code=status_code)
+
+async def stream_dashboard(
+    request: Request,
+    db: AsyncSession,
+    user: User,
+    version: int,
+    sort: str = "id",
+    **context
+):
+    """Рендерит дашборд со всеми карточками потоком.
+
+    Шапка и статистика уходят клиенту сразу, карточки — пачками по мере
+    чтения из базы через серверный курсор, так что время до первого байта
+    не зависит от размера колоды.
+    """
+    stats_html = await render_stats(
+        templates.get_template("_stats.html"), user.id, version, lambda: get_flashcard_stats(db, user.id)
+    )
+    card_template = templates.get_template("_flashcard.html")
+    column = SORT_COLUMNS[sort]
+    order_by = (Flashcard.id,) if sort == "id" else (column, Flashcard.id)
+
+    async def cards_html():
+        # Сессия запроса закрывается только после отправки ответа
+        result = await db.stream_scalars(
+            select(Flashcard)
+            .where(Flashcard.owner_id == user.id)
+            .order_by(*order_by)
+            .execution_options(yield_per=DASHBOARD_STREAM_BATCH)
+        )
+        async for cards in result.partitions():
+            yield render_cards(card_template, user.id, cards)
+
+    page = streaming_templates.get_template("dashboard.html").generate_async({
+        "request": request,
+        "user": user,
+        "cards_html": cards_html(),
+        "stats_html": stats_html,
+        "sort": sort,
+        "show_all": True,
+        **context
+    })
+    return StreamingResponse(page, media_type="text/html; charset=utf-8")
+
+def wants_fragment(request: Request) -> bool:
+    """Клиент (script.js) просит вместо всей страницы только изменённую карточку."""
+    return "application/json" in request.headers.get("accept", "")
+
+def redirect_to_dashboard(success: Optional[str] = None, error: Optional[str] = None):
+    """Post/Redirect/Get: сообщение переживает редирект в короткоживущей куке."""
+    response = RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+    flash = {key: value for key, value in (("success", success), ("error", error)) if value}
+    if flash:
+        response.set_cookie(
+            key="flash",
+            value=quote(json.dumps(flash, ensure_ascii=False)),
+            httponly=True,
+            max_age=60,
+            samesite="lax"
+        )
+    return response
+
+def pop_flash(request: Request) -> dict:
+    raw = request.cookies.get("flash")
+    if not raw:
+        return {}
+    try:
+        flash = json.loads(unquote(raw))
+    except ValueError:
+        return {}
+    return {key: flash[key] for key in ("success", "error") if isinstance(flash.get(key), str)}
+
+async def flashcard_fragment(db: AsyncSession, user: User, card: Optional[Flashcard], message: str, **extra):
+    """Ответ для частичного обновления: HTML одной карточки и свежая статистика."""
+    return JSONResponse({
+        "id": card.id if card else None,
+        "html": render_card(templates.get_template("_flashcard.html"), user.id, card) if card else None,
+        "stats": await get_flashcard_stats(db, user.id),
+        "success": message,
+        **extra
+    })
+
+def fragment_error(message: str, status_code: int = 400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
 # Защищённая страница дашборда
 @app.get(
     "/dashboard",
     response_class=HTMLResponse,
     summary="📊 Личный кабинет",
     description="""
-    👋 Показывает все карточки текущего пользователя.  
+    👋 Показывает карточки текущего пользователя постранично (параметры after и sort)
+    или все сразу потоком (all=true).  
     📈 Отображает статистику: всего карточек, выучено, в процессе.  
     🔒 Доступен только авторизованным пользователям (через куки с JWT).
     """,
@@ -99,19 +291,36 @@ async def get_current_user_from_cookie(request: Request):
 )
 async def dashboard(
     request: Request,
-    current_user: User = Depends(get_current_user_from_cookie)
+    after: Optional[str] = None,
+    sort: Literal["id", "created_at", "foreign_word"] = "id",
+    show_all: bool = Query(False, alias="all"),
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db)
 ):
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(Flashcard).where(Flashcard.owner_id == current_user.id)
-        )
-        flashcards = result.scalars().all()
-    
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "user": current_user,
-        "flashcards": flashcards
-    })
+    flash = pop_flash(request)
+    version = await get_collection_version(db, current_user.id)
+    etag = make_etag(
+        current_user.id, version.version, f"dashboard:{TEMPLATES_VERSION}:{current_user.username}:{after}:{sort}:{show_all}"
+    )
+    # Страница с одноразовым сообщением не кэшируется
+    if not flash and is_not_modified(request, etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+
+    if show_all:
+        response = await stream_dashboard(request, db, current_user, version.version, sort=sort, **flash)
+    else:
+        try:
+            response = await render_dashboard(
+                request, db, current_user, after=after, sort=sort, version=version.version, **flash
+            )
+        except ValueError:
+            # Битый курсор — показываем первую страницу
+            response = await render_dashboard(request, db, current_user, sort=sort, version=version.version, **flash)
+    if flash:
+        response.delete_cookie("flash")
+    else:
+        set_validators(response, etag, version.updated_at)
+    return response
 
 @app.post(
     "/web/login",
@@ -123,7 +332,7 @@ async def dashboard(
     ❌ При ошибке показывает сообщение на той же странице.
     """, tags=["🔐 Аутентификация"]
 )
-async def web_login(request: Request):
+async def web_login(request: Request, db: AsyncSession = Depends(get_db)):
     """Обработка HTML формы входа"""
     form = await request.form()
     username = form.get("username")
@@ -134,28 +343,83 @@ async def web_login(request: Request):
             "request": request,
             "login_error": "Имя пользователя и пароль обязательны"
         }, status_code=400)
+
+    # До обращения к базе и bcrypt
+    retry_after = await check_login(request, username)
+    if retry_after:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "login_error": "Слишком много попыток входа. Попробуйте позже."
+        }, status_code=429, headers=retry_after_header(retry_after))
     
-    async with SessionLocal() as db:
-        user = await authenticate_user(db, username, password)
-        if not user:
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "login_error": "Неверное имя пользователя или пароль"
-            }, status_code=401)
-        
-        access_token = create_access_token({"sub": user.username})
-        
+    user = await authenticate_user(db, username, password)
+    if not user:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "login_error": "Неверное имя пользователя или пароль"
+        }, status_code=401)
+    
+    response = RedirectResponse(url="/dashboard", status_code=status.HTTP_302_FOUND)
+    set_auth_cookies(response, user)
+    return response
 
-        response = RedirectResponse(url="/dashboard", status_code=status.HTTP_302_FOUND)
-        response.set_cookie(
-            key="access_token", 
-            value=f"Bearer {access_token}",
-            httponly=True,
-            max_age=1800, 
-            secure=False,  
-            samesite="lax"
-        )
+# Refresh-токен уходит только на /web/refresh, а не с каждым запросом к страницам
+REFRESH_COOKIE_PATH = "/web/refresh"
+
+def set_auth_cookies(response, user: User):
+    response.set_cookie(
+        key="access_token", 
+        value=f"Bearer {create_access_token({'sub': user.username})}",
+        httponly=True,
+        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60, 
+        secure=False,  
+        samesite="lax"
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=create_refresh_token({"sub": user.username}),
+        httponly=True,
+        max_age=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600,
+        path=REFRESH_COOKIE_PATH,
+        secure=False,
+        samesite="lax"
+    )
+
+def safe_next(next_url: Optional[str]) -> str:
+    # Только локальные пути, чтобы /web/refresh не стал открытым редиректом
+    if next_url and next_url.startswith("/") and not next_url.startswith("//"):
+        return next_url
+    return "/dashboard"
+
+@app.get(
+    "/web/refresh",
+    include_in_schema=False,
+)
+async def web_refresh(request: Request, next: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Выдаёт новый access-токен по refresh-куке без повторного ввода пароля.
+    Сюда перенаправляют страницы, получившие 401; без действующей refresh-куки — на вход.
+    script.js вызывает его с Accept: application/json и получает JSON вместо редиректа."""
+    user = None
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        try:
+            user = await get_user_from_refresh_token(refresh_token, db)
+        except Exception as e:
+            logger.info("Ошибка обновления токена: %s", e, extra={"sample_key": "token_decode"})
+    if user is None:
+        if wants_fragment(request):
+            response = JSONResponse(status_code=401, content={"error": "Войдите снова", "status_code": 401})
+        else:
+            response = RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
+        response.delete_cookie("access_token")
+        response.delete_cookie("refresh_token", path=REFRESH_COOKIE_PATH)
         return response
+    if wants_fragment(request):
+        response = JSONResponse({"refreshed": True})
+    else:
+        response = RedirectResponse(url=safe_next(next), status_code=status.HTTP_302_FOUND)
+    set_auth_cookies(response, user)
+    return response
 
 
 @app.post(
@@ -172,69 +436,49 @@ async def web_login(request: Request):
 )
 async def create_flashcard_web(
     request: Request,
-    current_user: User = Depends(get_current_user_from_cookie)
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db)
 ):
     form = await request.form()
     foreign_word = form.get("foreign_word")
     native_word = form.get("native_word")
     example = form.get("example", "")
     
+    error = None
     if not foreign_word or not native_word:
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcards": [],
-            "error": "Иностранное слово и перевод обязательны"
-        }, status_code=400)
-    
-    if len(foreign_word) > 100 or len(native_word) > 100:
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcards": [],
-            "error": "Слова не должны превышать 100 символов"
-        }, status_code=400)
-    
-    if example and len(example) > 500:
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcards": [],
-            "error": "Пример не должен превышать 500 символов"
-        }, status_code=400)
+        error = "Иностранное слово и перевод обязательны"
+    elif len(foreign_word) > 100 or len(native_word) > 100:
+        error = "Слова не должны превышать 100 символов"
+    elif example and len(example) > 500:
+        error = "Пример не должен превышать 500 символов"
+    if error:
+        if wants_fragment(request):
+            return fragment_error(error)
+        return redirect_to_dashboard(error=error)
     
-    async with SessionLocal() as db:
-        try:
-            new_flashcard = Flashcard(
-                foreign_word=foreign_word,
-                native_word=native_word,
-                example=example if example else None,
-                owner_id=current_user.id
-            )
-            db.add(new_flashcard)
-            await db.commit()
-            await db.refresh(new_flashcard)
-            
-            result = await db.execute(
-                select(Flashcard).where(Flashcard.owner_id == current_user.id)
-            )
-            flashcards = result.scalars().all()
-            
-            return templates.TemplateResponse("dashboard.html", {
-                "request": request,
-                "user": current_user,
-                "flashcards": flashcards,
-                "success": "Карточка успешно добавлена!"
-            })
-            
-        except Exception as e:
-            print(f"Ошибка создания карточки: {str(e)}")
-            return templates.TemplateResponse("dashboard.html", {
-                "request": request,
-                "user": current_user,
-                "flashcards": [],
-                "error": "Ошибка при создании карточки. Попробуйте позже."
-            }, status_code=500)
+    try:
+        new_flashcard = Flashcard(
+            foreign_word=foreign_word,
+            native_word=native_word,
+            example=example if example else None,
+            owner_id=current_user.id
+        )
+        db.add(new_flashcard)
+        await apply_stats_delta(db, current_user.id, total=1)
+        await mark_changed(db, new_flashcard)
+        await db.commit()
+        
+        message = "Карточка успешно добавлена!"
+        if wants_fragment(request):
+            return await flashcard_fragment(db, current_user, new_flashcard, message)
+        return redirect_to_dashboard(success=message)
+        
+    except Exception as e:
+        logger.exception("Ошибка создания карточки", extra={"user_id": current_user.id})
+        error = "Ошибка при создании карточки. Попробуйте позже."
+        if wants_fragment(request):
+            return fragment_error(error, status_code=500)
+        return redirect_to_dashboard(error=error)
 
 @app.post(
     "/web/register",
@@ -248,7 +492,7 @@ async def create_flashcard_web(
     """,
     tags=["🔐 Аутентификация"]
 )
-async def web_register(request: Request):
+async def web_register(request: Request, db: AsyncSession = Depends(get_db)):
     """Обработка HTML формы регистрации"""
     form = await request.form()
     username = form.get("username")
@@ -278,31 +522,37 @@ async def web_register(request: Request):
             "register_error": "Пароль слишком длинный (максимум 72 байта). Пожалуйста, сократите его."
         }, status_code=400)
     
-    async with SessionLocal() as db:
-        try:
-            existing = await db.execute(select(User).where(User.username == username))
-            if existing.scalars().first():
-                return templates.TemplateResponse("index.html", {
-                    "request": request,
-                    "register_error": "Имя пользователя уже занято"
-                }, status_code=400)
-            
-            hashed_password = get_password_hash(password)
-            db_user = User(username=username, hashed_password=hashed_password)
-            db.add(db_user)
-            await db.commit()
-            await db.refresh(db_user)
-            
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "success_message": "Регистрация успешна! Теперь вы можете войти."
-            })
-        except Exception as e:
-            print(f"Ошибка регистрации: {str(e)}")
+    retry_after = await check_register(request)
+    if retry_after:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "register_error": "Слишком много регистраций. Попробуйте позже."
+        }, status_code=429, headers=retry_after_header(retry_after))
+    
+    try:
+        existing = await db.execute(select(User).where(User.username == username))
+        if existing.scalars().first():
             return templates.TemplateResponse("index.html", {
                 "request": request,
-                "register_error": "Ошибка при регистрации. Попробуйте позже."
-            }, status_code=500)
+                "register_error": "Имя пользователя уже занято"
+            }, status_code=400)
+        
+        hashed_password = await password_hasher.hash(password)
+        db_user = User(username=username, hashed_password=hashed_password)
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "success_message": "Регистрация успешна! Теперь вы можете войти."
+        })
+    except Exception as e:
+        logger.exception("Ошибка регистрации", extra={"username": username})
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "register_error": "Ошибка при регистрации. Попробуйте позже."
+        }, status_code=500)
 
 @app.get(
     "/web/flashcards/{card_id}/edit",
@@ -318,25 +568,25 @@ async def web_register(request: Request):
 async def edit_flashcard_form(
     request: Request,
     card_id: int,
-    current_user: User = Depends(get_current_user_from_cookie)
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db)
 ):
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(Flashcard).where(
-                Flashcard.id == card_id,
-                Flashcard.owner_id == current_user.id
-            )
+    result = await db.execute(
+        select(Flashcard).where(
+            Flashcard.id == card_id,
+            Flashcard.owner_id == current_user.id
         )
-        flashcard = result.scalars().first()
-        
-        if not flashcard:
-            raise HTTPException(status_code=404, detail="Карточка не найдена")
-        
-        return templates.TemplateResponse("edit_flashcard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcard": flashcard
-        })
+    )
+    flashcard = result.scalars().first()
+    
+    if not flashcard:
+        raise HTTPException(status_code=404, detail="Карточка не найдена")
+    
+    return templates.TemplateResponse("edit_flashcard.html", {
+        "request": request,
+        "user": current_user,
+        "flashcard": flashcard
+    })
 
 @app.post(
     "/web/flashcards/{card_id}/update",
@@ -351,7 +601,8 @@ async def edit_flashcard_form(
 async def update_flashcard_web(
     request: Request,
     card_id: int,
-    current_user: User = Depends(get_current_user_from_cookie)
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db)
 ):
     form = await request.form()
     foreign_word = form.get("foreign_word")
@@ -359,41 +610,37 @@ async def update_flashcard_web(
     example = form.get("example", "")
     
     if not foreign_word or not native_word:
+        error = "Иностранное слово и перевод обязательны"
+        if wants_fragment(request):
+            return fragment_error(error)
         return templates.TemplateResponse("edit_flashcard.html", {
             "request": request,
             "user": current_user,
             "flashcard": {"id": card_id},
-            "error": "Иностранное слово и перевод обязательны"
+            "error": error
         }, status_code=400)
     
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(Flashcard).where(
-                Flashcard.id == card_id,
-                Flashcard.owner_id == current_user.id
-            )
-        )
-        flashcard = result.scalars().first()
-        
-        if not flashcard:
-            raise HTTPException(status_code=404, detail="Карточка не найдена")
-        
-        flashcard.foreign_word = foreign_word
-        flashcard.native_word = native_word
-        flashcard.example = example if example else None
-        await db.commit()
-        
-        result = await db.execute(
-            select(Flashcard).where(Flashcard.owner_id == current_user.id)
+    result = await db.execute(
+        select(Flashcard).where(
+            Flashcard.id == card_id,
+            Flashcard.owner_id == current_user.id
         )
-        flashcards = result.scalars().all()
-        
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcards": flashcards,
-            "success": "Карточка успешно обновлена!"
-        })
+    )
+    flashcard = result.scalars().first()
+    
+    if not flashcard:
+        raise HTTPException(status_code=404, detail="Карточка не найдена")
+    
+    flashcard.foreign_word = foreign_word
+    flashcard.native_word = native_word
+    flashcard.example = example if example else None
+    await mark_changed(db, flashcard)
+    await db.commit()
+    
+    message = "Карточка успешно обновлена!"
+    if wants_fragment(request):
+        return await flashcard_fragment(db, current_user, flashcard, message)
+    return redirect_to_dashboard(success=message)
 
 @app.post(
     "/web/flashcards/{card_id}/mark-learned",
@@ -402,7 +649,7 @@ async def update_flashcard_web(
     description="""
     🔄 Переключает статус: **выучено** ↔ **не выучено**.  
     📊 Увеличивает счётчик повторений.  
-    📅 Обновляет дату последнего повторения.  
+    📅 Обновляет дату последнего повторения и назначает следующее по SM-2.  
     🎯 Помогает отслеживать прогресс изучения.
     """,
     tags=["📚 Карточки"]
@@ -410,37 +657,32 @@ async def update_flashcard_web(
 async def mark_flashcard_learned(
     request: Request,
     card_id: int,
-    current_user: User = Depends(get_current_user_from_cookie)
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db)
 ):
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(Flashcard).where(
-                Flashcard.id == card_id,
-                Flashcard.owner_id == current_user.id
-            )
-        )
-        flashcard = result.scalars().first()
-        
-        if not flashcard:
-            raise HTTPException(status_code=404, detail="Карточка не найдена")
-        
-        flashcard.is_learned = not flashcard.is_learned
-        flashcard.repetitions += 1
-        flashcard.last_reviewed = datetime.utcnow()
-        
-        await db.commit()
-        
-        result = await db.execute(
-            select(Flashcard).where(Flashcard.owner_id == current_user.id)
+    result = await db.execute(
+        select(Flashcard).where(
+            Flashcard.id == card_id,
+            Flashcard.owner_id == current_user.id
         )
-        flashcards = result.scalars().all()
-        
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcards": flashcards,
-            "success": f"Карточка '{flashcard.foreign_word}' помечена как {'выученная' if flashcard.is_learned else 'не выученная'}"
-        })
+    )
+    flashcard = result.scalars().first()
+    
+    if not flashcard:
+        raise HTTPException(status_code=404, detail="Карточка не найдена")
+    
+    flashcard.is_learned = not flashcard.is_learned
+    # Отметка «выучено» — успешное повторение, снятие отметки — забытая карточка
+    schedule_review(flashcard, grade=5 if flashcard.is_learned else 1)
+    await apply_stats_delta(db, current_user.id, learned=1 if flashcard.is_learned else -1)
+    
+    await mark_changed(db, flashcard)
+    await db.commit()
+    
+    message = f"Карточка '{flashcard.foreign_word}' помечена как {'выученная' if flashcard.is_learned else 'не выученная'}"
+    if wants_fragment(request):
+        return await flashcard_fragment(db, current_user, flashcard, message)
+    return redirect_to_dashboard(success=message)
 
 @app.post(
     "/web/flashcards/{card_id}/delete",
@@ -456,34 +698,30 @@ async def mark_flashcard_learned(
 async def delete_flashcard_web(
     request: Request,
     card_id: int,
-    current_user: User = Depends(get_current_user_from_cookie)
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: AsyncSession = Depends(get_db)
 ):
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(Flashcard).where(
-                Flashcard.id == card_id,
-                Flashcard.owner_id == current_user.id
-            )
-        )
-        flashcard = result.scalars().first()
-        
-        if not flashcard:
-            raise HTTPException(status_code=404, detail="Карточка не найдена")
-        
-        await db.delete(flashcard)
-        await db.commit()
-        
-        result = await db.execute(
-            select(Flashcard).where(Flashcard.owner_id == current_user.id)
+    result = await db.execute(
+        select(Flashcard).where(
+            Flashcard.id == card_id,
+            Flashcard.owner_id == current_user.id
         )
-        flashcards = result.scalars().all()
-        
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "flashcards": flashcards,
-            "success": f"Карточка '{flashcard.foreign_word}' успешно удалена"
-        })
+    )
+    flashcard = result.scalars().first()
+    
+    if not flashcard:
+        raise HTTPException(status_code=404, detail="Карточка не найдена")
+    
+    await db.delete(flashcard)
+    await apply_stats_delta(db, current_user.id, total=-1, learned=-1 if flashcard.is_learned else 0)
+    await record_deletion(db, flashcard)
+    await db.commit()
+    invalidate_card(current_user.id, card_id)
+    
+    message = f"Карточка '{flashcard.foreign_word}' успешно удалена"
+    if wants_fragment(request):
+        return await flashcard_fragment(db, current_user, None, message, deleted=card_id)
+    return redirect_to_dashboard(success=message)
 
 @app.get(
     "/logout",
@@ -499,41 +737,99 @@ async def delete_flashcard_web(
 async def logout(request: Request):
     response = RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
     response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token", path=REFRESH_COOKIE_PATH)
     return response
 
+async def init_db():
+    """Схема, поисковый индекс и суперпользователь по умолчанию. Повторный вызов ничего не меняет."""
+    async with init_lock():
+        if MIGRATE_ON_STARTUP:
+            # Новые столбцы и индексы для уже существующей базы (см. migrations.py)
+            await upgrade(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(setup_search)
+        
+        async with SessionLocal() as db:
+            result = await db.execute(select(User).where(User.is_superuser == True))
+            superuser = result.scalars().first()
+            if not superuser:
+                hashed = await password_hasher.hash("admin123")  # Пароль по умолчанию
+                admin_user = User(username="admin", hashed_password=hashed, is_superuser=True)
+                db.add(admin_user)
+                await db.commit()
+                logger.warning(
+                    "Создан суперпользователь для админки: логин admin, пароль admin123 — смените пароль",
+                    extra={"username": "admin"}
+                )
+
+def preload_templates():
+    """Компилирует все шаблоны заранее: в serve.py это делается до fork, и воркеры
+    получают готовый код шаблонов вместо компиляции на первых запросах."""
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+        streaming_templates.get_template(name)
+
 @app.on_event("startup")
 async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    async with SessionLocal() as db:
-        result = await db.execute(select(User).where(User.is_superuser == True))
-        superuser = result.scalars().first()
-        if not superuser:
-            hashed = get_password_hash("admin123")  # Пароль по умолчанию
-            admin_user = User(username="admin", hashed_password=hashed, is_superuser=True)
-            db.add(admin_user)
-            await db.commit()
-            print("✅ Создан суперпользователь для админки:")
-            print("   Логин: admin")
-            print("   Пароль: admin123")
+    setup_logging()
+    if APP_INIT_DB:
+        await init_db()
+    if CACHE_INVALIDATION:
+        await invalidations.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await invalidations.stop()
+    password_hasher.shutdown()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+    stop_logging()
 
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """Обработчик всех HTTP-ошибок, включая 404."""
-    if exc.status_code == 404:
+    if exc.status_code == 404 and not request.url.path.startswith(API_PREFIX):
         return templates.TemplateResponse(
             "404.html", 
             {"request": request}, 
             status_code=404
         )
+    if (
+        exc.status_code == 401
+        and not request.url.path.startswith(API_PREFIX)
+        and request.url.path != "/metrics"
+    ):
+        if request.method in ("GET", "HEAD") and not wants_fragment(request):
+            # Истёкший access-токен на странице: продлеваем сессию по refresh-куке и возвращаемся
+            next_url = request.url.path
+            if request.url.query:
+                next_url += "?" + request.url.query
+            return RedirectResponse(
+                url=f"{REFRESH_COOKIE_PATH}?next={quote(next_url)}", status_code=status.HTTP_303_SEE_OTHER
+            )
+        if not wants_fragment(request):
+            # Данные формы редиректом не повторить: изменение не выполнено, просим войти заново
+            return templates.TemplateResponse("401.html", {"request": request}, status_code=401)
+        # script.js сам вызывает /web/refresh и повторяет запрос
+        return JSONResponse(
+            status_code=401,
+            content={
+                "error": "Сессия истекла",
+                "detail": exc.detail,
+                "status_code": 401,
+                "refresh": REFRESH_COOKIE_PATH,
+            },
+        )
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "error": "HTTP Error",
             "detail": exc.detail,
             "status_code": exc.status_code
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -0,0 +1,238 @@
+import time
+from bisect import bisect_left
+from jinja2 import Template
+
+# Границы корзин гистограмм (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Gauge(Counter):
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe — это bisect и два сложения."""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self.series = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """Метрики процесса. Коллекторы вызываются только при запросе /metrics,
+    поэтому состояние пула, очереди bcrypt и кэшей на горячем пути не трогается."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        self.collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP-запросы по маршруту и классу статуса", ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Время ответа по маршруту (до начала ответа)", ("method", "route")
+))
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "Запросы в обработке"))
+template_render = registry.register(Histogram(
+    "template_render_seconds", "Время рендера шаблона", ("template",), buckets=RENDER_BUCKETS
+))
+
+
+def route_label(scope) -> str:
+    """Шаблон пути вместо самого пути, чтобы id карточек не плодили серии."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    root_path = scope.get("root_path", "")
+    if root_path and root_path != scope.get("app_root_path", ""):
+        # Смонтированное приложение: /static, /admin
+        return root_path + "/*"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = "5xx"
+        http_in_flight.inc()
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = f"{message['status'] // 100}xx"
+                http_latency.observe(time.perf_counter() - started, scope["method"], route_label(scope))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_in_flight.dec()
+            http_requests.inc(scope["method"], route_label(scope), status)
+
+
+class TimedTemplate(Template):
+    """Шаблон Jinja, замеряющий своё время рендера (и полного потокового вывода)."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_render.observe(time.perf_counter() - started, self.name)
+
+    async def generate_async(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            async for chunk in super().generate_async(*args, **kwargs):
+                yield chunk
+        finally:
+            template_render.observe(time.perf_counter() - started, self.name)
+
+
+@registry.collector
+def pool_metrics():
+    from database import pool_stats, engine, read_engine
+
+    checkouts = Counter("db_pool_checkouts_total", "Выдачи соединений из пула")
+    checkouts.inc(amount=pool_stats["checkouts"])
+    checked_out = Gauge("db_pool_checked_out", "Соединения, выданные сейчас")
+    checked_out.inc(amount=pool_stats["checked_out"])
+    held = Counter("db_pool_held_seconds_total", "Суммарное время удержания соединений")
+    held.inc(amount=pool_stats["held_seconds_total"])
+    acquire = Counter("db_pool_acquire_seconds_total", "Суммарное время ожидания соединения из пула")
+    acquire.inc(amount=pool_stats["acquire_seconds_total"])
+    acquire_max = Gauge("db_pool_acquire_seconds_max", "Самое долгое ожидание соединения")
+    acquire_max.inc(amount=pool_stats["acquire_seconds_max"])
+    slow = Counter("db_pool_slow_checkouts_total", "Соединения, удержанные дольше DB_CHECKOUT_WARN_MS")
+    slow.inc(amount=pool_stats["slow_checkouts"])
+    concurrent = Counter("db_pool_concurrent_checkouts_total", "Случаи, когда запрос держал два соединения")
+    concurrent.inc(amount=pool_stats["concurrent_checkouts"])
+    metrics = [checkouts, checked_out, held, acquire, acquire_max, slow, concurrent]
+
+    size = Gauge("db_pool_size", "Размер пула", ("engine",))
+    overflow = Gauge("db_pool_overflow", "Соединения сверх размера пула", ("engine",))
+    engines = {"write": engine} if read_engine is engine else {"write": engine, "read": read_engine}
+    for name, each in engines.items():
+        pool = each.sync_engine.pool
+        if hasattr(pool, "overflow"):
+            size.inc(name, amount=pool.size())
+            overflow.inc(name, amount=max(pool.overflow(), 0))
+    return metrics + [size, overflow]
+
+
+@registry.collector
+def password_hasher_metrics():
+    from passwords import password_hasher
+
+    stats = password_hasher.stats()
+    metrics = []
+    for key in ("workers", "queued", "in_flight", "max_queued"):
+        gauge = Gauge(f"password_hash_{key}", f"Пул хеширования паролей: {key}")
+        gauge.inc(amount=stats[key])
+        metrics.append(gauge)
+    completed = Counter("password_hash_completed_total", "Выполненные хеширования и проверки паролей")
+    completed.inc(amount=stats["completed"])
+    return metrics + [completed]
+
+
+@registry.collector
+def cache_metrics():
+    from auth import user_cache
+    from fragments import card_fragments, stats_fragments
+    from tokens import token_verifier
+
+    hits = Counter("cache_hits_total", "Попадания в кэш", ("cache",))
+    misses = Counter("cache_misses_total", "Промахи кэша", ("cache",))
+    entries = Gauge("cache_entries", "Записей в кэше", ("cache",))
+    ratio = Gauge("cache_hit_ratio", "Доля попаданий с запуска процесса", ("cache",))
+    caches = (
+        ("user", user_cache), ("token", token_verifier.cache),
+        ("card_fragment", card_fragments), ("stats_fragment", stats_fragments),
+    )
+    for name, cache in caches:
+        hits.inc(name, amount=cache.hits)
+        misses.inc(name, amount=cache.misses)
+        entries.inc(name, amount=len(cache))
+        lookups = cache.hits + cache.misses
+        ratio.inc(name, amount=round(cache.hits / lookups, 4) if lookups else 0)
+    return [hits, misses, entries, ratio]
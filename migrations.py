@@ -0,0 +1,306 @@
+"""Миграции схемы.
+
+create_all создаёт только отсутствующие таблицы, поэтому новые столбцы
+и индексы сами до существующей базы не доходят. Миграции идемпотентны:
+каждая проверяет, что уже сделано, поэтому на новой базе, созданной
+create_all, они просто отмечаются как применённые. Номера применённых
+хранятся в таблице schema_migrations.
+
+Индексы на PostgreSQL строятся через CREATE INDEX CONCURRENTLY (без
+блокировки записи), заполнение новых столбцов идёт пачками по
+MIGRATION_BATCH_SIZE строк, каждая в своей транзакции, так что запись
+из приложения успевает проходить между пачками.
+
+    python migrations.py status
+    python migrations.py upgrade
+    python migrations.py verify
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, insert, text
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(32), primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+    Column("duration_ms", Integer, nullable=False, default=0),
+)
+
+# concurrent — миграция выполняется вне транзакции (нужно для CREATE INDEX CONCURRENTLY)
+Migration = namedtuple("Migration", ["version", "name", "apply", "concurrent"])
+
+
+def _is_postgres(conn) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def backfill(conn, table: str, assignment: str, condition: str, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """UPDATE пачками: короткие транзакции вместо одной длинной блокировки таблицы."""
+    total = 0
+    while True:
+        result = conn.execute(text(
+            f"UPDATE {table} SET {assignment} "
+            f"WHERE id IN (SELECT id FROM {table} WHERE {condition} LIMIT :batch_size)"
+        ), {"batch_size": batch_size})
+        conn.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+
+# (столбец, SQL-значение по умолчанию для уже существующих строк)
+FLASHCARD_COLUMNS = [
+    ("updated_at", None),
+    ("change_seq", "0"),
+    ("ease_factor", "2.5"),
+    ("interval_days", "0"),
+    ("due_at", None),
+]
+
+
+def add_flashcard_columns(conn):
+    from models import Flashcard
+
+    existing = {column["name"] for column in inspect(conn).get_columns("flashcards")}
+    for name, default in FLASHCARD_COLUMNS:
+        if name in existing:
+            continue
+        column = Flashcard.__table__.c[name]
+        ddl = f"ALTER TABLE flashcards ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}"
+        if default is not None:
+            # Константа по умолчанию: и SQLite, и PostgreSQL 11+ не переписывают таблицу
+            ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        conn.execute(text(ddl))
+    conn.commit()
+
+    # Без due_at карточка не попадёт в очередь повторения: делаем старые карточки доступными сразу
+    backfill(conn, "flashcards", "due_at = COALESCE(created_at, CURRENT_TIMESTAMP)", "due_at IS NULL")
+    backfill(conn, "flashcards", "updated_at = COALESCE(last_reviewed, created_at)", "updated_at IS NULL AND created_at IS NOT NULL")
+
+
+def create_tables(conn):
+    from models import FlashcardStats, FlashcardVersion, FlashcardTombstone, CacheInvalidation
+
+    for model in (FlashcardStats, FlashcardVersion, FlashcardTombstone, CacheInvalidation):
+        model.__table__.create(conn, checkfirst=True)
+    conn.commit()
+
+
+def backfill_change_seq(conn, batch_size: int = MIGRATION_BATCH_SIZE):
+    """Раздаёт существующим карточкам номера изменений из версии коллекции владельца,
+    чтобы первая дельта-синхронизация (since=0) вернула их все."""
+    while True:
+        rows = conn.execute(text(
+            "SELECT owner_id, id FROM flashcards "
+            "WHERE change_seq = 0 AND owner_id IS NOT NULL ORDER BY owner_id, id LIMIT :batch_size"
+        ), {"batch_size": batch_size}).all()
+        if not rows:
+            return
+        by_owner = {}
+        for owner_id, card_id in rows:
+            by_owner.setdefault(owner_id, []).append(card_id)
+        for owner_id, card_ids in by_owner.items():
+            count = len(card_ids)
+            version = conn.execute(text(
+                "UPDATE flashcard_versions SET version = version + :count, updated_at = :now "
+                "WHERE user_id = :owner_id RETURNING version"
+            ), {"count": count, "now": datetime.utcnow(), "owner_id": owner_id}).scalar()
+            if version is None:
+                version = count
+                conn.execute(text(
+                    "INSERT INTO flashcard_versions (user_id, version, updated_at) VALUES (:owner_id, :version, :now)"
+                ), {"owner_id": owner_id, "version": version, "now": datetime.utcnow()})
+            first = version - count + 1
+            conn.execute(
+                text("UPDATE flashcards SET change_seq = :seq WHERE id = :id"),
+                [{"seq": first + n, "id": card_id} for n, card_id in enumerate(card_ids)],
+            )
+        conn.commit()
+
+
+def _invalid_indexes(conn) -> set:
+    """Индексы, оставшиеся невалидными после прерванного CREATE INDEX CONCURRENTLY."""
+    if not _is_postgres(conn):
+        return set()
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+    )).scalars())
+
+
+def create_index_sql(conn, index) -> str:
+    sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+    if _is_postgres(conn):
+        sql = re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", sql)
+    return sql
+
+
+def create_flashcard_indexes(conn):
+    """Индексы модели Flashcard, которых нет в базе (keyset-пагинация, очередь повторения,
+    синхронизация, статистика)."""
+    from models import Flashcard
+
+    existing = {index["name"] for index in inspect(conn).get_indexes("flashcards")}
+    invalid = _invalid_indexes(conn)
+    for index in sorted(Flashcard.__table__.indexes, key=lambda index: index.name):
+        if index.name in invalid:
+            logger.warning("Пересоздаётся невалидный индекс", extra={"index": index.name})
+            conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if _is_postgres(conn) else ''}{index.name}"))
+        elif index.name in existing:
+            continue
+        started = time.perf_counter()
+        conn.execute(text(create_index_sql(conn, index)))
+        conn.commit()
+        logger.info(
+            "Создан индекс",
+            extra={"index": index.name, "duration_ms": round((time.perf_counter() - started) * 1000)},
+        )
+
+
+MIGRATIONS = [
+    Migration("0001", "Столбцы карточек: updated_at, change_seq, интервальное повторение", add_flashcard_columns, False),
+    Migration("0002", "Таблицы счётчиков, версий коллекций, tombstones и сброса кэшей", create_tables, False),
+    Migration("0003", "Номера изменений для существующих карточек", backfill_change_seq, False),
+    Migration("0004", "Составные индексы карточек", create_flashcard_indexes, True),
+]
+
+
+async def applied_versions(engine, create: bool = True) -> dict:
+    async with engine.begin() as conn:
+        if create:
+            await conn.run_sync(schema_migrations.create, checkfirst=True)
+        elif not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(schema_migrations.name)):
+            # status и verify базу не меняют
+            return {}
+        rows = (await conn.execute(select(schema_migrations))).all()
+    return {row.version: row for row in rows}
+
+
+async def upgrade(engine) -> list:
+    """Создаёт недостающие таблицы и применяет недостающие миграции по порядку;
+    возвращает номера применённых."""
+    import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+    from database import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    applied = await applied_versions(engine)
+    done = []
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        started = time.perf_counter()
+        async with engine.connect() as conn:
+            if migration.concurrent and conn.dialect.name == "postgresql":
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.run_sync(migration.apply)
+            await conn.commit()
+        duration_ms = round((time.perf_counter() - started) * 1000)
+        async with engine.begin() as conn:
+            await conn.execute(insert(schema_migrations).values(
+                version=migration.version, name=migration.name, duration_ms=duration_ms
+            ))
+        logger.info(
+            "Миграция применена",
+            extra={"version": migration.version, "migration": migration.name, "duration_ms": duration_ms},
+        )
+        done.append(migration.version)
+    return done
+
+
+def _schema_problems(conn) -> list:
+    import models  # noqa: F401
+    from database import Base
+
+    problems = []
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    invalid = _invalid_indexes(conn)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            problems.append(f"нет таблицы {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                problems.append(f"нет столбца {table.name}.{column.name}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                problems.append(f"нет индекса {index.name}")
+            elif index.name in invalid:
+                problems.append(f"индекс {index.name} невалиден")
+    if "flashcards" in tables and "change_seq" in {column["name"] for column in inspector.get_columns("flashcards")}:
+        unnumbered = conn.execute(text(
+            "SELECT COUNT(*) FROM flashcards WHERE change_seq = 0 AND owner_id IS NOT NULL"
+        )).scalar()
+        if unnumbered:
+            problems.append(f"карточек без номера изменения: {unnumbered}")
+    return problems
+
+
+async def verify(engine) -> list:
+    """Сверяет базу с моделями: таблицы, столбцы, индексы и применённые миграции."""
+    applied = await applied_versions(engine, create=False)
+    problems = [
+        f"не применена миграция {migration.version} ({migration.name})"
+        for migration in MIGRATIONS if migration.version not in applied
+    ]
+    async with engine.connect() as conn:
+        problems += await conn.run_sync(_schema_problems)
+    return problems
+
+
+async def run_command(command: str) -> int:
+    from database import engine, init_lock
+
+    try:
+        if command == "status":
+            applied = await applied_versions(engine, create=False)
+            for migration in MIGRATIONS:
+                row = applied.get(migration.version)
+                state = f"применена {row.applied_at:%Y-%m-%d %H:%M} ({row.duration_ms} мс)" if row else "ожидает"
+                print(f"{migration.version}  {state:<36} {migration.name}")
+            return 0
+        if command == "upgrade":
+            async with init_lock():
+                done = await upgrade(engine)
+            print(f"Применено миграций: {len(done)}" + (f" ({', '.join(done)})" if done else ""))
+            return 0
+        problems = await verify(engine)
+        for problem in problems:
+            print(f"✗ {problem}")
+        if not problems:
+            print("✓ Схема соответствует моделям")
+        return 1 if problems else 0
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["status", "upgrade", "verify"])
+    args = parser.parse_args(argv)
+    from logs import setup_logging
+
+    setup_logging()
+    sys.exit(asyncio.run(run_command(args.command)))
+
+
+if __name__ == "__main__":
+    main()
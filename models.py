@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -21,5 +21,78 @@ class Flashcard(Base):
     last_reviewed = Column(DateTime, nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Номер изменения в последовательности пользователя (версия коллекции), для дельта-синхронизации
+    change_seq = Column(Integer, nullable=False, default=0)
+    # Состояние интервального повторения (см. scheduler.py)
+    ease_factor = Column(Float, default=2.5, nullable=False)
+    interval_days = Column(Integer, default=0, nullable=False)
+    due_at = Column(DateTime, default=datetime.utcnow)
 
-    owner = relationship("User")
\ No newline at end of file
+    owner = relationship("User")
+
+    # Составные индексы под keyset-пагинацию списка карточек пользователя
+    __table_args__ = (
+        Index("ix_flashcards_owner_id_id", "owner_id", "id"),
+        Index("ix_flashcards_owner_id_created_at", "owner_id", "created_at", "id"),
+        Index("ix_flashcards_owner_id_foreign_word", "owner_id", "foreign_word", "id"),
+        # Очередь повторения: выборка due_at <= now — диапазонный проход по индексу
+        Index("ix_flashcards_owner_id_due_at", "owner_id", "due_at"),
+        Index("ix_flashcards_owner_id_change_seq", "owner_id", "change_seq"),
+        # Статистика: COUNT(*) FILTER (WHERE is_learned) по пользователю считается по индексу
+        Index("ix_flashcards_owner_id_is_learned", "owner_id", "is_learned"),
+    )
+
+
+class FlashcardStats(Base):
+    """Счётчики карточек пользователя, обновляемые инкрементально (см. stats.py)."""
+    __tablename__ = "flashcard_stats"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    learned = Column(Integer, nullable=False, default=0)
+
+
+class FlashcardVersion(Base):
+    """Версия коллекции карточек пользователя: растёт при каждом изменении (см. versions.py)."""
+    __tablename__ = "flashcard_versions"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class FlashcardTombstone(Base):
+    """След удалённой карточки, чтобы клиенты узнали об удалении при синхронизации."""
+    __tablename__ = "flashcard_tombstones"
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    card_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_flashcard_tombstones_owner_id_change_seq", "owner_id", "change_seq"),
+    )
+
+
+class CacheInvalidation(Base):
+    """Событие сброса кэша для остальных воркеров (см. invalidation.py)."""
+    __tablename__ = "cache_invalidations"
+    id = Column(Integer, primary_key=True)
+    origin = Column(String(32), nullable=False)
+    kind = Column(String(32), nullable=False)
+    payload = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    # Без AUTOINCREMENT SQLite после очистки старых событий выдал бы id заново,
+    # и воркеры, запомнившие последний прочитанный id, пропустили бы новые
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+class RateLimitBucket(Base):
+    """Корзина ограничения частоты, общая для всех воркеров (см. ratelimit.DatabaseBackend)."""
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String(200), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # Время в секундах Unix: последнее списание и момент, когда корзина снова полная
+    updated_at = Column(Float, nullable=False)
+    full_at = Column(Float, nullable=False, index=True)
@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Flashcard
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Допустимые сортировки; id добавляется вторым ключом, чтобы порядок был стабильным
+SORT_COLUMNS = {
+    "id": Flashcard.id,
+    "created_at": Flashcard.created_at,
+    "foreign_word": Flashcard.foreign_word,
+}
+
+
+def encode_cursor(sort: str, card: Flashcard) -> str:
+    value = getattr(card, sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, card.id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(sort: str, cursor: str):
+    """Разбирает курсор в пару (значение сортировки, id). Бросает ValueError, если курсор битый."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+        if sort == "created_at":
+            value = datetime.fromisoformat(value)
+        return value, int(last_id)
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def flashcards_page_query(owner_id: int, limit: int, after: Optional[str] = None, sort: str = "id"):
+    column = SORT_COLUMNS[sort]
+    stmt = select(Flashcard).where(Flashcard.owner_id == owner_id)
+    if after:
+        value, last_id = decode_cursor(sort, after)
+        if sort == "id":
+            stmt = stmt.where(Flashcard.id > last_id)
+        else:
+            stmt = stmt.where(tuple_(column, Flashcard.id) > tuple_(value, last_id))
+    if sort == "id":
+        stmt = stmt.order_by(Flashcard.id)
+    else:
+        stmt = stmt.order_by(column, Flashcard.id)
+    return stmt.limit(limit + 1)
+
+
+async def fetch_flashcards_page(
+    db: AsyncSession,
+    owner_id: int,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+    sort: str = "id",
+):
+    """Возвращает (карточки страницы, курсор следующей страницы или None).
+
+    Выбирается на одну строку больше limit, чтобы без COUNT(*) понять,
+    есть ли следующая страница.
+    """
+    result = await db.execute(flashcards_page_query(owner_id, limit, after, sort))
+    cards = result.scalars().all()
+    next_cursor = None
+    if len(cards) > limit:
+        cards = cards[:limit]
+        next_cursor = encode_cursor(sort, cards[-1])
+    return cards, next_cursor
@@ -0,0 +1,106 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+# "thread" или "process": bcrypt отпускает GIL, поэтому потоков обычно достаточно
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Прозрачно перехешировать пароль при входе, если схема или cost устарели
+PASSWORD_REHASH = os.getenv("PASSWORD_REHASH", "0") == "1"
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib и bcrypt загружаются при первом хешировании, а не при импорте приложения
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _truncate(password):
+    # bcrypt учитывает только первые 72 байта
+    if isinstance(password, str) and len(password) > 72:
+        password = password[:72]
+    return password
+
+
+def _hash(password):
+    return get_pwd_context().hash(_truncate(password))
+
+
+def _verify(password, hashed_password):
+    return get_pwd_context().verify(_truncate(password), hashed_password)
+
+
+def _verify_and_update(password, hashed_password):
+    return get_pwd_context().verify_and_update(_truncate(password), hashed_password)
+
+
+class PasswordHasher:
+    """Выполняет bcrypt в пуле воркеров, не блокируя event loop.
+
+    Одновременно в пул отправляется не больше workers задач, остальные
+    ждут своей очереди; размер очереди доступен через stats().
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, executor: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = workers
+        self.executor_kind = executor
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.max_queued = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password, hashed_password) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    async def verify_and_update(self, password, hashed_password):
+        """Возвращает (верен ли пароль, новый хеш или None)."""
+        return await self._run(_verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "max_queued": self.max_queued,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
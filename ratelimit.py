@@ -0,0 +1,188 @@
+import logging
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+# 0 — ограничение выключено (например, в бенчмарке, где все клиенты с одного адреса)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# Попытки входа: запас (burst) и пополнение в минуту — отдельно по IP и по имени пользователя
+LOGIN_RATE_BURST = int(os.getenv("LOGIN_RATE_BURST", "10"))
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))
+# Регистрация — по IP
+REGISTER_RATE_BURST = int(os.getenv("REGISTER_RATE_BURST", "5"))
+REGISTER_RATE_PER_MINUTE = float(os.getenv("REGISTER_RATE_PER_MINUTE", "5"))
+# Где хранить корзины: memory — в процессе, database — в таблице rate_limit_buckets,
+# общей для всех воркеров (serve.py включает её при нескольких воркерах)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Предел числа ключей в памяти: при переполнении вытесняются давно не обновлявшиеся
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_EVICT_INTERVAL = float(os.getenv("RATE_LIMIT_EVICT_INTERVAL", "60"))
+
+rate_limited = registry.register(Counter(
+    "rate_limited_total", "Запросы, отклонённые ограничением частоты", ("limiter", "key_type")
+))
+
+
+class RateLimitBackend(ABC):
+    """Хранилище корзин. Для нескольких воркеров подставляется общее (Redis и т.п.)
+    с той же семантикой take."""
+
+    @abstractmethod
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> float:
+        """Списывает cost токенов из корзины key. Возвращает 0, если токенов
+        хватило, иначе — через сколько секунд их станет достаточно."""
+
+
+class MemoryBackend(RateLimitBackend):
+    """Корзины в памяти процесса: на ключ — три числа, все операции O(1)."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, evict_interval: float = RATE_LIMIT_EVICT_INTERVAL):
+        self.max_keys = max_keys
+        self.evict_interval = evict_interval
+        # ключ -> [токены, время обновления, время, когда корзина снова полная]
+        self.buckets: OrderedDict = OrderedDict()
+        self.next_eviction = time.monotonic() + evict_interval
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> float:
+        now = time.monotonic()
+        if now >= self.next_eviction:
+            self.evict(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        if tokens < cost:
+            return (cost - tokens) / rate
+        tokens -= cost
+        self.buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return 0.0
+
+    def evict(self, now: Optional[float] = None):
+        """Удаляет корзины, которые уже снова полные: они ничем не отличаются от отсутствующих."""
+        now = time.monotonic() if now is None else now
+        full = [key for key, bucket in self.buckets.items() if bucket[2] <= now]
+        for key in full:
+            del self.buckets[key]
+        self.next_eviction = now + self.evict_interval
+
+
+class DatabaseBackend(RateLimitBackend):
+    """Корзины в таблице rate_limit_buckets: лимит общий для всех воркеров.
+
+    Пополнение и списание — один INSERT ... ON CONFLICT DO UPDATE: база
+    сериализует попытки по ключу, так что параллельные запросы из разных
+    процессов не списывают один и тот же токен дважды.
+    """
+
+    def __init__(self, evict_interval: float = RATE_LIMIT_EVICT_INTERVAL):
+        self.evict_interval = evict_interval
+        self.next_eviction = time.time() + evict_interval
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> float:
+        from sqlalchemy import case, delete
+        from database import SessionLocal, upsert
+        from models import RateLimitBucket as Bucket
+
+        now = time.time()
+        refilled = Bucket.tokens + (now - Bucket.updated_at) * rate
+        available = case((refilled > capacity, capacity), else_=refilled)
+        allowed = available >= cost
+        async with SessionLocal() as db:
+            if now >= self.next_eviction:
+                self.next_eviction = now + self.evict_interval
+                # Снова полные корзины ничем не отличаются от отсутствующих
+                await db.execute(delete(Bucket).where(Bucket.full_at <= now))
+            row = (await db.execute(
+                upsert(db, Bucket)
+                .values(key=key, tokens=capacity - cost, updated_at=now, full_at=now + cost / rate)
+                .on_conflict_do_update(
+                    index_elements=[Bucket.key],
+                    set_={
+                        "tokens": case((allowed, available - cost), else_=Bucket.tokens),
+                        "full_at": case((allowed, now + (capacity - available + cost) / rate), else_=Bucket.full_at),
+                        "updated_at": case((allowed, now), else_=Bucket.updated_at),
+                    },
+                )
+                .returning(Bucket.tokens, Bucket.updated_at)
+            )).one()
+            await db.commit()
+        if row.updated_at == now:
+            return 0.0
+        tokens = min(capacity, row.tokens + (now - row.updated_at) * rate)
+        return max(cost - tokens, 0.0) / rate
+
+
+class RateLimiter:
+    """Token bucket: до burst попыток подряд, дальше — per_minute попыток в минуту на ключ."""
+
+    def __init__(self, name: str, burst: int, per_minute: float, backend: RateLimitBackend):
+        self.name = name
+        self.capacity = burst
+        self.rate = per_minute / 60
+        self.backend = backend
+
+    async def hit(self, **keys) -> float:
+        """Учитывает попытку по ключам (ip=..., username=...) по порядку.
+        Возвращает 0 или число секунд до следующей разрешённой попытки.
+        После первого отказа следующие ключи не списываются: перебор с
+        одного адреса не расходует лимит имени пользователя сверх лимита адреса."""
+        if not RATE_LIMIT_ENABLED:
+            return 0.0
+        for key_type, value in keys.items():
+            if not value:
+                continue
+            wait = await self.backend.take(f"{self.name}:{key_type}:{value}", self.capacity, self.rate)
+            if wait:
+                rate_limited.inc(self.name, key_type)
+                logger.warning(
+                    "Превышен лимит попыток",
+                    extra={"limiter": self.name, "key_type": key_type, "sample_key": f"rate_limit:{self.name}"},
+                )
+                return wait
+        return 0.0
+
+
+def client_ip(request) -> Optional[str]:
+    # За прокси адрес клиента подставляет uvicorn --proxy-headers
+    return request.client.host if request.client else None
+
+
+def normalize_username(username) -> Optional[str]:
+    if not isinstance(username, str):
+        return None
+    return username.strip().lower()[:64] or None
+
+
+def retry_after_header(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+backend = DatabaseBackend() if RATE_LIMIT_BACKEND == "database" else MemoryBackend()
+login_limiter = RateLimiter("login", LOGIN_RATE_BURST, LOGIN_RATE_PER_MINUTE, backend)
+register_limiter = RateLimiter("register", REGISTER_RATE_BURST, REGISTER_RATE_PER_MINUTE, backend)
+
+
+def set_backend(new_backend: RateLimitBackend):
+    """Подменяет хранилище корзин у всех ограничителей (до начала обработки запросов)."""
+    global backend
+    backend = new_backend
+    for limiter in (login_limiter, register_limiter):
+        limiter.backend = new_backend
+
+
+async def check_login(request, username) -> float:
+    return await login_limiter.hit(ip=client_ip(request), username=normalize_username(username))
+
+
+async def check_register(request) -> float:
+    return await register_limiter.hit(ip=client_ip(request))
@@ -1,31 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from schemas import UserCreate, UserOut
+from schemas import UserCreate, UserOut, TokenPair, RefreshRequest
 from models import User
-from auth import get_password_hash, authenticate_user, create_access_token
-from database import SessionLocal
+from auth import authenticate_user, get_user_from_refresh_token, issue_token_pair
+from tokens import TokenError
+from passwords import password_hasher
+from ratelimit import check_login, check_register, retry_after_header
+from database import get_db
 
-router = APIRouter(prefix="/auth", tags=["Аутентификация"])
+router = APIRouter(prefix="/auth", tags=["Аутентификация"], default_response_class=ORJSONResponse)
 
 @router.post("/register", response_model=UserOut, summary="Регистрация пользователя")
-async def register(user: UserCreate, db: AsyncSession = Depends(SessionLocal)):
+async def register(request: Request, user: UserCreate, db: AsyncSession = Depends(get_db)):
+    retry_after = await check_register(request)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много регистраций, попробуйте позже",
+            headers=retry_after_header(retry_after),
+        )
     existing = await db.execute(select(User).where(User.username == user.username))
     if existing.scalars().first():
         raise HTTPException(status_code=400, detail="Имя пользователя уже занято")
-    hashed = get_password_hash(user.password)
+    hashed = await password_hasher.hash(user.password)
     db_user = User(username=user.username, hashed_password=hashed)
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
     return db_user
 
-@router.post("/token", summary="Получить JWT-токен")
+@router.post("/token", response_model=TokenPair, summary="Получить JWT-токен")
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),  
-    db: AsyncSession = Depends(SessionLocal)
+    db: AsyncSession = Depends(get_db)
 ):
+    retry_after = await check_login(request, form_data.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много попыток входа, попробуйте позже",
+            headers=retry_after_header(retry_after),
+        )
     user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -33,5 +52,19 @@ async def login(
             detail="Неверное имя пользователя или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return issue_token_pair(user)
+
+@router.post("/refresh", response_model=TokenPair, summary="Обновить JWT-токен по refresh-токену")
+async def refresh(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Недействительный refresh-токен",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        user = await get_user_from_refresh_token(body.refresh_token, db)
+    except TokenError:
+        raise credentials_exception
+    if user is None:
+        raise credentials_exception
+    return issue_token_pair(user)
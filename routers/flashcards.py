@@ -1,39 +1,288 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from schemas import FlashcardCreate, FlashcardUpdate, FlashcardOut
+from sqlalchemy import select, insert
+from typing import Literal, Optional
+from datetime import datetime, timezone
+from schemas import (
+    FlashcardCreate, FlashcardUpdate, FlashcardOut, FlashcardPage, FlashcardStatsOut,
+    BulkImportResult, FlashcardScheduleOut, ReviewIn, FlashcardChanges,
+)
 from models import Flashcard
 from auth import get_current_user
-from database import SessionLocal
+from database import get_db
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, fetch_flashcards_page
+from stats import get_flashcard_stats, apply_stats_delta
+from versions import (
+    bump_collection_version, mark_changed, record_deletion, get_collection_version, make_etag,
+    is_not_modified, not_modified, set_validators,
+)
+from scheduler import schedule_review
+from search import search_flashcards
+from fragments import invalidate_card
+from sync import DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT, fetch_changes
+from serializers import flashcard_to_dict, flashcard_schedule_to_dict, flashcard_change_to_dict, serialize_many
+from bulk import (
+    BULK_BATCH_SIZE, BULK_MAX_ERRORS, EXPORT_COLUMNS,
+    iter_lines, iter_csv_rows, iter_ndjson_rows, csv_chunk, ndjson_chunk,
+)
 
-router = APIRouter(prefix="/flashcards", tags=["Карточки"])
+# Ответы собираются заранее подготовленными сериализаторами и отдаются через orjson
+router = APIRouter(prefix="/flashcards", tags=["Карточки"], default_response_class=ORJSONResponse)
+
+MAX_REVIEW_BATCH = 500
 
 @router.post("/", response_model=FlashcardOut, summary="Создать карточку")
 async def create_flashcard(
     card: FlashcardCreate,
-    db: AsyncSession = Depends(SessionLocal),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     db_card = Flashcard(**card.model_dump(), owner_id=current_user.id)
     db.add(db_card)
+    await apply_stats_delta(db, current_user.id, total=1)
+    await mark_changed(db, db_card)
     await db.commit()
     await db.refresh(db_card)
-    return db_card
+    return ORJSONResponse(flashcard_to_dict(db_card))
+
+@router.post(
+    "/bulk",
+    response_model=BulkImportResult,
+    summary="Массовый импорт карточек",
+    description="Тело запроса — CSV (text/csv, заголовок с foreign_word,native_word[,example]) "
+                "или NDJSON (application/x-ndjson). Файл читается потоком, "
+                "валидные строки вставляются пачками в одной транзакции.",
+)
+async def bulk_import_flashcards(
+    request: Request,
+    data_format: Optional[Literal["csv", "ndjson"]] = Query(
+        None, alias="format", description="По умолчанию определяется по Content-Type"
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    if data_format is None:
+        content_type = request.headers.get("content-type", "")
+        data_format = "csv" if "csv" in content_type else "ndjson"
+    lines = iter_lines(request.stream())
+    rows = iter_csv_rows(lines) if data_format == "csv" else iter_ndjson_rows(lines)
+
+    async def insert_batch(batch):
+        # Одно обновление версии на пачку: строки получают номера изменений подряд
+        last_seq = await bump_collection_version(db, current_user.id, count=len(batch))
+        for change_seq, values in enumerate(batch, start=last_seq - len(batch) + 1):
+            values["change_seq"] = change_seq
+        await db.execute(insert(Flashcard), batch)
 
-@router.get("/", response_model=list[FlashcardOut], summary="Список всех карточек")
+    imported, failed, errors, batch = 0, 0, [], []
+    try:
+        async for row_no, row in rows:
+            if isinstance(row, Exception):
+                problems = [str(row)]
+            else:
+                try:
+                    card = FlashcardCreate.model_validate(row)
+                    problems = None
+                except ValidationError as e:
+                    problems = [f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()]
+            if problems:
+                failed += 1
+                if len(errors) < BULK_MAX_ERRORS:
+                    errors.append({"row": row_no, "errors": problems})
+                continue
+            values = card.model_dump()
+            values["example"] = values["example"] or None
+            batch.append({**values, "owner_id": current_user.id})
+            if len(batch) >= BULK_BATCH_SIZE:
+                await insert_batch(batch)
+                imported += len(batch)
+                batch = []
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    if batch:
+        await insert_batch(batch)
+        imported += len(batch)
+    await apply_stats_delta(db, current_user.id, total=imported)
+    await db.commit()
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+@router.get("/", response_model=FlashcardPage, summary="Список карточек (постранично)")
 async def read_flashcards(
-    db: AsyncSession = Depends(SessionLocal),
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущей страницы"),
+    sort: Literal["id", "created_at", "foreign_word"] = "id",
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    # Если коллекция не менялась, отвечаем 304, не читая flashcards
+    version = await get_collection_version(db, current_user.id)
+    etag = make_etag(current_user.id, version.version, f"list:{limit}:{after}:{sort}")
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+
+    try:
+        cards, next_cursor = await fetch_flashcards_page(db, current_user.id, limit, after, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = ORJSONResponse({
+        "items": serialize_many(flashcard_to_dict, cards),
+        "next_cursor": next_cursor
+    })
+    return set_validators(response, etag, version.updated_at)
+
+@router.get("/export", summary="Экспорт всех карточек (CSV или NDJSON)")
+async def export_flashcards(
+    data_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    result = await db.execute(select(Flashcard).where(Flashcard.owner_id == current_user.id))
-    return result.scalars().all()
+    owner_id = current_user.id
+    columns = [getattr(Flashcard, name) for name in EXPORT_COLUMNS]
+
+    async def generate():
+        # Сессия запроса закрывается только после отправки ответа; строки читаются пачками через yield_per
+        result = await db.stream(
+            select(*columns)
+            .where(Flashcard.owner_id == owner_id)
+            .order_by(Flashcard.id)
+            .execution_options(yield_per=BULK_BATCH_SIZE)
+        )
+        if data_format == "csv":
+            yield csv_chunk([], with_header=True)
+        async for rows in result.partitions():
+            yield csv_chunk(rows) if data_format == "csv" else ndjson_chunk(rows)
+
+    media_type = "text/csv" if data_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=f"{media_type}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="flashcards.{data_format}"'},
+    )
+
+@router.get("/due", response_model=list[FlashcardScheduleOut], summary="Карточки к повторению")
+async def read_due_flashcards(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    # Обслуживается индексом (owner_id, due_at): диапазон по due_at уже отсортирован
+    result = await db.execute(
+        select(Flashcard)
+        .where(
+            Flashcard.owner_id == current_user.id,
+            Flashcard.due_at <= datetime.utcnow()
+        )
+        .order_by(Flashcard.due_at)
+        .limit(limit)
+    )
+    return ORJSONResponse(serialize_many(flashcard_schedule_to_dict, result.scalars().all()))
+
+@router.post(
+    "/reviews",
+    response_model=list[FlashcardScheduleOut],
+    summary="Отправить результаты повторений пачкой",
+    description="Применяет результаты целой сессии в одной транзакции и возвращает новое расписание карточек.",
+)
+async def submit_reviews(
+    reviews: list[ReviewIn] = Body(..., min_length=1, max_length=MAX_REVIEW_BATCH),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    card_ids = {review.card_id for review in reviews}
+    # Одна проверка владения на всю пачку: id IN (...) AND owner_id = ?
+    result = await db.execute(
+        select(Flashcard).where(
+            Flashcard.id.in_(card_ids),
+            Flashcard.owner_id == current_user.id
+        )
+    )
+    cards = {card.id: card for card in result.scalars().all()}
+    missing = sorted(card_ids - cards.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Карточки не найдены: {missing}")
+
+    now = datetime.utcnow()
+    def reviewed_at(review):
+        if review.reviewed_at is None:
+            return now
+        value = review.reviewed_at
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return min(value, now)
+
+    # Повторения одной карточки применяются в хронологическом порядке
+    for review in sorted(reviews, key=reviewed_at):
+        schedule_review(cards[review.card_id], review.grade, reviewed_at(review))
+    last_seq = await bump_collection_version(db, current_user.id, count=len(cards))
+    for change_seq, card_id in enumerate(sorted(cards), start=last_seq - len(cards) + 1):
+        cards[card_id].change_seq = change_seq
+    await db.commit()
+    return ORJSONResponse([flashcard_schedule_to_dict(cards[card_id]) for card_id in sorted(cards)])
+
+@router.get(
+    "/changes",
+    response_model=FlashcardChanges,
+    summary="Изменения с момента последней синхронизации",
+    description="Возвращает карточки, созданные или изменённые после since, и id удалённых. "
+                "Первый запрос — since=0; дальше передавайте cursor из ответа, пока has_more=true.",
+)
+async def read_flashcard_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="cursor из предыдущего ответа"),
+    limit: int = Query(DEFAULT_SYNC_LIMIT, ge=1, le=MAX_SYNC_LIMIT),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    # Уже синхронизированный клиент получает 304 по одной строке версии
+    version = await get_collection_version(db, current_user.id)
+    etag = make_etag(current_user.id, version.version, f"changes:{since}:{limit}")
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+
+    upserted, deleted, cursor, has_more = await fetch_changes(db, current_user.id, since, limit)
+    response = ORJSONResponse({
+        "upserted": serialize_many(flashcard_change_to_dict, upserted),
+        "deleted": deleted,
+        "cursor": cursor,
+        "has_more": has_more,
+    })
+    return set_validators(response, etag, version.updated_at)
+
+@router.get("/search", response_model=list[FlashcardOut], summary="Поиск по карточкам")
+async def search(
+    q: str = Query(..., min_length=1, max_length=100, description="Слово, перевод или фрагмент примера; опечатки допускаются"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    cards = await search_flashcards(db, current_user.id, q, limit)
+    return ORJSONResponse(serialize_many(flashcard_to_dict, cards))
+
+@router.get("/stats", response_model=FlashcardStatsOut, summary="Статистика по карточкам")
+async def read_flashcard_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    return await get_flashcard_stats(db, current_user.id)
 
 @router.get("/{card_id}", response_model=FlashcardOut, summary="Получить карточку по ID")
 async def read_flashcard(
+    request: Request,
     card_id: int,
-    db: AsyncSession = Depends(SessionLocal),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
+    # Карточка не могла измениться, пока не менялась версия коллекции: и ETag,
+    # и Last-Modified берутся из версии коллекции, в 200 и в 304 одинаковые
+    version = await get_collection_version(db, current_user.id)
+    etag = make_etag(current_user.id, version.version, f"card:{card_id}")
+    if is_not_modified(request, etag, version.updated_at, exists=False):
+        return not_modified(etag, version.updated_at)
+
     result = await db.execute(
         select(Flashcard).where(
             Flashcard.id == card_id,
@@ -43,13 +292,15 @@ async def read_flashcard(
     card = result.scalars().first()
     if not card:
         raise HTTPException(status_code=404, detail="Карточка не найдена")
-    return card
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified(etag, version.updated_at)
+    return set_validators(ORJSONResponse(flashcard_to_dict(card)), etag, version.updated_at)
 
 @router.put("/{card_id}", response_model=FlashcardOut, summary="Обновить карточку")
 async def update_flashcard(
     card_id: int,
     card_update: FlashcardUpdate,
-    db: AsyncSession = Depends(SessionLocal),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     result = await db.execute(
@@ -63,14 +314,15 @@ async def update_flashcard(
         raise HTTPException(status_code=404, detail="Карточка не найдена")
     for key, value in card_update.model_dump(exclude_unset=True).items():
         setattr(db_card, key, value)
+    await mark_changed(db, db_card)
     await db.commit()
     await db.refresh(db_card)
-    return db_card
+    return ORJSONResponse(flashcard_to_dict(db_card))
 
 @router.delete("/{card_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Удалить карточку")
 async def delete_flashcard(
     card_id: int,
-    db: AsyncSession = Depends(SessionLocal),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     result = await db.execute(
@@ -83,5 +335,8 @@ async def delete_flashcard(
     if not db_card:
         raise HTTPException(status_code=404, detail="Карточка не найдена")
     await db.delete(db_card)
+    await apply_stats_delta(db, current_user.id, total=-1, learned=-1 if db_card.is_learned else 0)
+    await record_deletion(db, db_card)
     await db.commit()
+    invalidate_card(current_user.id, card_id)
     return
\ No newline at end of file
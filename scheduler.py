@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from models import Flashcard
+
+# Параметры алгоритма SM-2
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+# Оценка от 0 до 5: ниже этого порога ответ считается забытым
+PASSING_GRADE = 3
+
+
+def schedule_review(card: Flashcard, grade: int, reviewed_at: Optional[datetime] = None) -> Flashcard:
+    """Применяет к карточке результат повторения по SM-2 и назначает следующее (due_at)."""
+    reviewed_at = reviewed_at or datetime.utcnow()
+    ease = card.ease_factor or DEFAULT_EASE
+    interval = card.interval_days or 0
+
+    if grade < PASSING_GRADE:
+        interval = FIRST_INTERVAL_DAYS
+    elif interval < FIRST_INTERVAL_DAYS:
+        interval = FIRST_INTERVAL_DAYS
+    elif interval == FIRST_INTERVAL_DAYS:
+        interval = SECOND_INTERVAL_DAYS
+    else:
+        interval = round(interval * ease)
+
+    ease += 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)
+
+    card.ease_factor = max(MIN_EASE, ease)
+    card.interval_days = interval
+    card.due_at = reviewed_at + timedelta(days=interval)
+    card.repetitions = (card.repetitions or 0) + 1
+    card.last_reviewed = reviewed_at
+    return card
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional
+from datetime import datetime
 import re
 
 class UserCreate(BaseModel):
@@ -36,6 +37,15 @@ class UserOut(BaseModel):
         "from_attributes": True
     }
 
+class TokenPair(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int = Field(..., description="Время жизни access-токена, секунды")
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class FlashcardCreate(BaseModel):
     foreign_word: str = Field(
         ...,
@@ -79,4 +89,55 @@ class FlashcardOut(BaseModel):
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+class FlashcardPage(BaseModel):
+    items: list[FlashcardOut]
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Курсор следующей страницы (параметр after), null — страниц больше нет"
+    )
+
+class FlashcardStatsOut(BaseModel):
+    total: int
+    learned: int
+    in_progress: int
+
+class BulkImportError(BaseModel):
+    row: int = Field(..., description="Номер строки во входном файле")
+    errors: list[str]
+
+class BulkImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: list[BulkImportError]
+
+class FlashcardScheduleOut(FlashcardOut):
+    is_learned: bool
+    repetitions: int
+    ease_factor: float
+    interval_days: int
+    due_at: Optional[datetime] = None
+    last_reviewed: Optional[datetime] = None
+
+class ReviewIn(BaseModel):
+    card_id: int
+    grade: int = Field(..., ge=0, le=5, description="Оценка ответа по SM-2: 0 — забыл, 5 — идеально")
+    reviewed_at: Optional[datetime] = Field(
+        None,
+        description="Время повторения на клиенте; по умолчанию — время получения запроса"
+    )
+
+class FlashcardChangeOut(FlashcardScheduleOut):
+    change_seq: int
+    updated_at: Optional[datetime] = None
+
+class FlashcardDeletedOut(BaseModel):
+    id: int
+    change_seq: int
+
+class FlashcardChanges(BaseModel):
+    upserted: list[FlashcardChangeOut]
+    deleted: list[FlashcardDeletedOut]
+    cursor: int = Field(..., description="Передайте как since в следующем запросе")
+    has_more: bool = Field(..., description="true — изменения ещё есть, запросите следующую порцию")
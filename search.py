@@ -0,0 +1,213 @@
+import re
+from sqlalchemy import select, text, table, column, func, or_, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Flashcard
+
+# Кандидатов из полнотекстового индекса берём с запасом, затем отсекаем по похожести
+SEARCH_CANDIDATES_FACTOR = 4
+SEARCH_MIN_SIMILARITY = 0.5
+
+# SQLite: внешний FTS5-индекс по таблице flashcards с триграммным токенизатором.
+# Владелец индексируется столбцом owner ("#<owner_id>#"): условие на него входит
+# в сам MATCH, и поиск перебирает только карточки пользователя, а не всю таблицу.
+# Содержимое индекс берёт из представления, триггеры поддерживают его в
+# актуальном состоянии при любых изменениях строк, включая массовый импорт
+# и правки через админку.
+SQLITE_DDL = [
+    """
+    CREATE VIEW IF NOT EXISTS flashcards_search AS
+    SELECT id, foreign_word, native_word, example, '#' || owner_id || '#' AS owner FROM flashcards
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+        foreign_word, native_word, example, owner,
+        content='flashcards_search', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_fts_ai AFTER INSERT ON flashcards BEGIN
+        INSERT INTO flashcards_fts(rowid, foreign_word, native_word, example, owner)
+        VALUES (new.id, new.foreign_word, new.native_word, new.example, '#' || new.owner_id || '#');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_fts_ad AFTER DELETE ON flashcards BEGIN
+        INSERT INTO flashcards_fts(flashcards_fts, rowid, foreign_word, native_word, example, owner)
+        VALUES ('delete', old.id, old.foreign_word, old.native_word, old.example, '#' || old.owner_id || '#');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_fts_au
+    AFTER UPDATE OF foreign_word, native_word, example, owner_id ON flashcards BEGIN
+        INSERT INTO flashcards_fts(flashcards_fts, rowid, foreign_word, native_word, example, owner)
+        VALUES ('delete', old.id, old.foreign_word, old.native_word, old.example, '#' || old.owner_id || '#');
+        INSERT INTO flashcards_fts(rowid, foreign_word, native_word, example, owner)
+        VALUES (new.id, new.foreign_word, new.native_word, new.example, '#' || new.owner_id || '#');
+    END
+    """,
+    # Слово важнее перевода, перевод важнее примера; владелец на ранг не влияет
+    "INSERT INTO flashcards_fts(flashcards_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 0.0)')",
+]
+
+# Индекс прежнего вида (без столбца owner) пересоздаётся
+SQLITE_DROP_LEGACY = [
+    "DROP TRIGGER IF EXISTS flashcards_fts_ai",
+    "DROP TRIGGER IF EXISTS flashcards_fts_ad",
+    "DROP TRIGGER IF EXISTS flashcards_fts_au",
+    "DROP TABLE IF EXISTS flashcards_fts",
+]
+
+# PostgreSQL: tsvector как генерируемый столбец (обновляется самой СУБД) и триграммные индексы
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(foreign_word, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(native_word, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(example, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_search_vector ON flashcards USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_foreign_word_trgm ON flashcards USING gin (foreign_word gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_native_word_trgm ON flashcards USING gin (native_word gin_trgm_ops)",
+]
+
+flashcards_fts = table("flashcards_fts", column("rowid"), column("rank"))
+
+
+def setup_search(conn):
+    """Создаёт поисковые индексы; вызывается синхронно через conn.run_sync при старте."""
+    if conn.dialect.name == "sqlite":
+        existing = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'flashcards_fts'")
+        ).scalar()
+        exists = existing is not None and "owner" in existing
+        if existing is not None and not exists:
+            for statement in SQLITE_DROP_LEGACY:
+                conn.execute(text(statement))
+        for statement in SQLITE_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            # Индекс только что создан — заполняем его уже существующими карточками
+            conn.execute(text("INSERT INTO flashcards_fts(flashcards_fts) VALUES ('rebuild')"))
+    elif conn.dialect.name == "postgresql":
+        for statement in POSTGRES_DDL:
+            conn.execute(text(statement))
+
+
+def trigrams(value: str) -> set:
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def similarity(query: str, card: Flashcard) -> float:
+    """Доля триграмм запроса, найденных в самом похожем поле карточки.
+
+    Как word_similarity() в pg_trgm: длинный пример не штрафуется за то,
+    что в нём есть и другие слова.
+    """
+    query_grams = trigrams(query)
+    if not query_grams:
+        return 0.0
+    best = 0.0
+    for value in (card.foreign_word, card.native_word, card.example):
+        if not value:
+            continue
+        grams = trigrams(value)
+        if grams:
+            best = max(best, len(query_grams & grams) / len(query_grams))
+    return best
+
+
+def _sqlite_match_expression(query: str) -> str:
+    # Любая общая триграмма даёт кандидата, bm25 поднимает наиболее совпадающие
+    grams = sorted(set().union(*(trigrams(term) for term in query.split())))
+    return " OR ".join('"' + gram.replace('"', '""') + '"' for gram in grams)
+
+
+def _sqlite_owner_match(owner_id: int, query: str) -> str:
+    return f'owner : "#{int(owner_id)}#" AND ({_sqlite_match_expression(query)})'
+
+
+def _tsquery(query: str) -> str:
+    terms = re.findall(r"\w+", query.lower())
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+async def search_flashcards(db: AsyncSession, owner_id: int, query: str, limit: int):
+    query = query.strip()
+    dialect = db.bind.dialect.name
+
+    if dialect == "postgresql":
+        score = func.greatest(
+            func.ts_rank(literal_column("flashcards.search_vector"), func.to_tsquery("simple", _tsquery(query))),
+            func.similarity(Flashcard.foreign_word, query),
+            func.similarity(Flashcard.native_word, query),
+        )
+        conditions = [
+            Flashcard.foreign_word.op("%")(query),
+            Flashcard.native_word.op("%")(query),
+        ]
+        if _tsquery(query):
+            conditions.append(
+                literal_column("flashcards.search_vector").op("@@")(func.to_tsquery("simple", _tsquery(query)))
+            )
+        result = await db.execute(
+            select(Flashcard)
+            .where(Flashcard.owner_id == owner_id, or_(*conditions))
+            .order_by(score.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    prefix = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    if dialect != "sqlite" or not _sqlite_match_expression(query):
+        # Короче трёх символов триграмм нет — ищем по началу слова
+        result = await db.execute(
+            select(Flashcard)
+            .where(
+                Flashcard.owner_id == owner_id,
+                or_(
+                    Flashcard.foreign_word.ilike(prefix, escape="\\"),
+                    Flashcard.native_word.ilike(prefix, escape="\\"),
+                )
+            )
+            .order_by(Flashcard.foreign_word)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    match = _sqlite_owner_match(owner_id, query)
+    lowered = query.lower()
+    scored = []
+    offset, batch = 0, limit * SEARCH_CANDIDATES_FACTOR
+    # Кандидатов добираем порциями (каждая вдвое больше), пока порог похожести
+    # не пройдут limit карточек или кандидаты пользователя не кончатся
+    while True:
+        result = await db.execute(
+            select(Flashcard)
+            .join(flashcards_fts, flashcards_fts.c.rowid == Flashcard.id)
+            .where(
+                text("flashcards_fts MATCH :match").bindparams(match=match),
+                Flashcard.owner_id == owner_id,
+            )
+            .order_by(flashcards_fts.c.rank)
+            .offset(offset)
+            .limit(batch)
+        )
+        cards = result.scalars().all()
+        for card in cards:
+            score = similarity(query, card)
+            is_prefix = any(
+                value and value.lower().startswith(lowered)
+                for value in (card.foreign_word, card.native_word)
+            )
+            if is_prefix or score >= SEARCH_MIN_SIMILARITY:
+                scored.append((not is_prefix, -score, card.id, card))
+        if len(scored) >= limit or len(cards) < batch:
+            break
+        offset += batch
+        batch *= 2
+    scored.sort(key=lambda item: item[:3])
+    return [card for *_, card in scored[:limit]]
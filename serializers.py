@@ -0,0 +1,25 @@
+from operator import attrgetter
+from schemas import FlashcardOut, FlashcardScheduleOut, FlashcardChangeOut
+
+
+def make_serializer(schema):
+    """Собирает функцию ORM-объект -> dict по полям схемы.
+
+    Строки из нашей же базы уже валидны, поэтому from_attributes-валидация
+    pydantic здесь не нужна: поля читаются одним attrgetter, а dict
+    сериализуется orjson (он сам умеет datetime).
+    """
+    fields = tuple(schema.model_fields)
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        return lambda obj: {fields[0]: getter(obj)}
+    return lambda obj: dict(zip(fields, getter(obj)))
+
+
+flashcard_to_dict = make_serializer(FlashcardOut)
+flashcard_schedule_to_dict = make_serializer(FlashcardScheduleOut)
+flashcard_change_to_dict = make_serializer(FlashcardChangeOut)
+
+
+def serialize_many(serializer, objects):
+    return [serializer(obj) for obj in objects]
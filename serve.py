@@ -0,0 +1,161 @@
+"""Запуск в несколько процессов.
+
+Главный процесс один раз создаёт схему и суперпользователя, импортирует
+приложение и компилирует шаблоны, открывает сокет и делает fork нужного
+числа воркеров uvicorn. Воркеры принимают соединения с общего сокета,
+упавший воркер перезапускается. Кэши процессов сбрасываются во всех
+воркерах через таблицу cache_invalidations (см. invalidation.py), лимиты
+попыток входа и регистрации считаются по таблице rate_limit_buckets.
+
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4
+    python serve.py --init-only        # только схема, например отдельным шагом деплоя
+
+/metrics показывает метрики того воркера, который принял запрос.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("serve")
+
+# Воркер, проживший меньше, считается упавшим при старте: перезапуск с паузой
+MIN_WORKER_UPTIME = 1.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        help="Число воркеров (по умолчанию WEB_CONCURRENCY или число ядер)",
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--init-only", action="store_true", help="Создать схему и выйти")
+    return parser.parse_args(argv)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+async def prepare(main):
+    await main.init_db()
+    # До fork: соединения и потоки не должны достаться воркерам
+    main.password_hasher.shutdown()
+    await main.engine.dispose()
+    if main.read_engine is not main.engine:
+        await main.read_engine.dispose()
+
+
+def run_worker(sock: socket.socket, app):
+    import uvicorn
+    from logs import setup_logging
+
+    setup_logging()
+    # Сигналы обрабатывает uvicorn: SIGTERM — мягкая остановка
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, lifespan="on", log_config=None, access_log=False, proxy_headers=True)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(args):
+    # Воркеры не повторяют инициализацию, включают общий канал сброса кэшей
+    # и общие корзины ограничения частоты (иначе лимит входа умножался бы на число воркеров)
+    os.environ["APP_INIT_DB"] = "0"
+    if args.workers > 1:
+        os.environ.setdefault("CACHE_INVALIDATION", "1")
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "database")
+
+    import main
+    import ratelimit
+
+    asyncio.run(prepare(main))
+    if args.workers > 1 and isinstance(ratelimit.backend, ratelimit.MemoryBackend):
+        logger.warning(
+            "RATE_LIMIT_BACKEND=memory: у каждого воркера свои лимиты, фактический лимит в N раз выше",
+            extra={"workers": args.workers},
+        )
+    main.preload_templates()
+    # Админка тоже настраивается до fork, а не на первом запросе в каждом воркере
+    main.admin.load()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    logger.info(
+        "Запуск воркеров", extra={"workers": args.workers, "address": f"{args.host}:{args.port}"}
+    )
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, main.app)
+            except BaseException:
+                logger.exception("Воркер завершился с ошибкой")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(
+            "Воркер завершился, перезапуск",
+            extra={"pid": pid, "exit_code": os.waitstatus_to_exitcode(status)},
+        )
+        if time.monotonic() - started < MIN_WORKER_UPTIME:
+            time.sleep(MIN_WORKER_UPTIME)
+        spawn()
+    sock.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.init_only:
+        import main as app_main
+
+        asyncio.run(prepare(app_main))
+        return
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py использует fork; на этой платформе запускайте uvicorn main:app")
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -87,4 +87,102 @@ document.addEventListener('DOMContentLoaded', function () {
 			}
 		})
 	}
+	const flashcardsContainer = document.getElementById('flashcards-container')
+	if (flashcardsContainer) {
+		const showMessage = (text, isError) => {
+			if (!text) return
+			const message = document.createElement('div')
+			message.className = isError ? 'error-message' : 'success-message'
+			message.textContent = text
+			const main = document.querySelector('main')
+			main.insertBefore(message, main.firstChild)
+			setTimeout(() => message.remove(), 5000)
+		}
+
+		const renderStats = stats => {
+			if (!stats) return
+			document.getElementById('stat-total').textContent = stats.total
+			document.getElementById('stat-learned').textContent = stats.learned
+			document.getElementById('stat-in-progress').textContent =
+				stats.in_progress
+		}
+
+		const reapplyFilter = () => {
+			const activeFilter = document.querySelector('.filter-btn.active')
+			if (activeFilter) activeFilter.click()
+		}
+
+		const toElement = html => {
+			const template = document.createElement('template')
+			template.innerHTML = html.trim()
+			return template.content.firstElementChild
+		}
+
+		// Отправляет форму и получает в ответ только изменённую карточку вместо всей страницы
+		const submitPartial = async form => {
+			const send = () =>
+				fetch(form.action, {
+					method: 'POST',
+					headers: { Accept: 'application/json' },
+					body: new FormData(form),
+				})
+			let response = await send()
+			if (response.status === 401) {
+				// Истёк access-токен: продлеваем сессию по refresh-куке и повторяем запрос
+				const refreshed = await fetch('/web/refresh', {
+					headers: { Accept: 'application/json' },
+				})
+				if (!refreshed.ok) {
+					window.location.href = '/'
+					return null
+				}
+				response = await send()
+			}
+			const data = await response.json()
+			if (!response.ok) {
+				showMessage(data.error || data.detail || 'Ошибка запроса', true)
+				return null
+			}
+			renderStats(data.stats)
+			showMessage(data.success, false)
+			return data
+		}
+
+		const addForm = document.getElementById('add-flashcard-form')
+		if (addForm) {
+			addForm.addEventListener('submit', async function (e) {
+				e.preventDefault()
+				try {
+					const data = await submitPartial(addForm)
+					if (!data) return
+					const emptyState = flashcardsContainer.querySelector('.no-cards')
+					if (emptyState) emptyState.remove()
+					flashcardsContainer.prepend(toElement(data.html))
+					addForm.reset()
+					reapplyFilter()
+				} catch (error) {
+					addForm.submit()
+				}
+			})
+		}
+
+		flashcardsContainer.addEventListener('submit', async function (e) {
+			const form = e.target
+			if (e.defaultPrevented || !form.classList.contains('inline-form')) return
+			e.preventDefault()
+			try {
+				const data = await submitPartial(form)
+				if (!data) return
+				const card = form.closest('.flashcard')
+				if (data.deleted) {
+					card.remove()
+				} else {
+					card.replaceWith(toElement(data.html))
+					reapplyFilter()
+				}
+			} catch (error) {
+				form.submit()
+			}
+		})
+	}
 })
@@ -0,0 +1,69 @@
+import os
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import upsert
+from models import Flashcard, FlashcardStats
+
+# Хранить счётчики в таблице flashcard_stats вместо подсчёта при каждом запросе
+FLASHCARD_STATS_COUNTERS = os.getenv("FLASHCARD_STATS_COUNTERS", "0") == "1"
+
+
+def _stats(total: int, learned: int) -> dict:
+    return {"total": total, "learned": learned, "in_progress": total - learned}
+
+
+async def aggregate_flashcard_stats(db: AsyncSession, owner_id: int) -> dict:
+    """Считает статистику одним запросом: COUNT(*) и COUNT(*) FILTER (WHERE is_learned)."""
+    result = await db.execute(
+        select(
+            func.count(),
+            func.count().filter(Flashcard.is_learned == True),
+        ).where(Flashcard.owner_id == owner_id)
+    )
+    total, learned = result.one()
+    return _stats(total, learned)
+
+
+async def get_flashcard_stats(db: AsyncSession, owner_id: int) -> dict:
+    if FLASHCARD_STATS_COUNTERS:
+        row = await db.get(FlashcardStats, owner_id)
+        if row is not None:
+            return _stats(row.total, row.learned)
+    # Строка счётчиков появляется при первом изменении, до этого считаем агрегатом
+    return await aggregate_flashcard_stats(db, owner_id)
+
+
+async def apply_stats_delta(db: AsyncSession, owner_id: int, total: int = 0, learned: int = 0):
+    """Сдвигает счётчики пользователя в текущей транзакции; вызывать до commit.
+
+    Если строки счётчиков ещё нет, она создаётся из агрегата, который уже
+    учитывает текущее (не закоммиченное) изменение.
+    """
+    if not FLASHCARD_STATS_COUNTERS:
+        return
+    result = await db.execute(
+        update(FlashcardStats)
+        .where(FlashcardStats.user_id == owner_id)
+        .values(
+            total=FlashcardStats.total + total,
+            learned=FlashcardStats.learned + learned,
+        )
+    )
+    if result.rowcount == 0:
+        stats = await aggregate_flashcard_stats(db, owner_id)
+        # Строку мог уже вставить параллельный запрос: тогда в ней нет только нашего изменения
+        await db.execute(
+            upsert(db, FlashcardStats)
+            .values(user_id=owner_id, total=stats["total"], learned=stats["learned"])
+            .on_conflict_do_update(
+                index_elements=[FlashcardStats.user_id],
+                set_={"total": FlashcardStats.total + total, "learned": FlashcardStats.learned + learned},
+            )
+        )
+
+
+async def reset_stats(db: AsyncSession, owner_id: int):
+    """Сбрасывает счётчики: пригодится после правок в обход обычных обработчиков (админка)."""
+    if not FLASHCARD_STATS_COUNTERS:
+        return
+    await db.execute(delete(FlashcardStats).where(FlashcardStats.user_id == owner_id))
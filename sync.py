@@ -0,0 +1,40 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Flashcard, FlashcardTombstone
+
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 1000
+
+
+async def fetch_changes(db: AsyncSession, owner_id: int, since: int = 0, limit: int = DEFAULT_SYNC_LIMIT):
+    """Изменения коллекции после номера since: (изменённые карточки, tombstones, курсор, есть ли ещё).
+
+    Номера изменений у пользователя уникальны (это версия коллекции), поэтому
+    обе выборки идут по индексу (owner_id, change_seq), а курсор — просто
+    последний отданный номер. Карточка, изменённая несколько раз, отдаётся
+    один раз — с последним номером.
+    """
+    cards = (await db.execute(
+        select(Flashcard)
+        .where(Flashcard.owner_id == owner_id, Flashcard.change_seq > since)
+        .order_by(Flashcard.change_seq)
+        .limit(limit + 1)
+    )).scalars().all()
+    tombstones = (await db.execute(
+        select(FlashcardTombstone.card_id, FlashcardTombstone.change_seq)
+        .where(FlashcardTombstone.owner_id == owner_id, FlashcardTombstone.change_seq > since)
+        .order_by(FlashcardTombstone.change_seq)
+        .limit(limit + 1)
+    )).all()
+
+    changes = sorted(
+        [(card.change_seq, card) for card in cards] + [(row.change_seq, row) for row in tombstones],
+        key=lambda item: item[0],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1][0] if changes else since
+
+    upserted = [item for _, item in changes if isinstance(item, Flashcard)]
+    deleted = [{"id": item.card_id, "change_seq": seq} for seq, item in changes if not isinstance(item, Flashcard)]
+    return upserted, deleted, cursor, has_more
@@ -0,0 +1,82 @@
+"""Окружения Jinja и заранее скомпилированные шаблоны.
+
+    python templating.py    # скомпилировать templates/ в compiled_templates/
+
+Скомпилированные шаблоны — обычные модули Python: процесс импортирует их
+(с .pyc из __pycache__) вместо разбора и компиляции исходников на первых
+запросах. В manifest.json хранится хеш исходников; если шаблоны изменились,
+а компиляцию не повторили, используются исходники.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from jinja2 import ChoiceLoader, Environment, FileSystemLoader, ModuleLoader
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(os.getenv("TEMPLATES_DIR", "templates"))
+COMPILED_TEMPLATES_DIR = Path(os.getenv("COMPILED_TEMPLATES_DIR", "compiled_templates"))
+
+# Обычный и асинхронный (для generate_async) варианты компилируются по-разному
+VARIANTS = {"sync": False, "async": True}
+
+
+def sources_hash(directory: Path = TEMPLATES_DIR) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            digest.update(path.relative_to(directory).as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _compiled_is_current() -> bool:
+    manifest = COMPILED_TEMPLATES_DIR / "manifest.json"
+    if not manifest.exists():
+        return False
+    if json.loads(manifest.read_text(encoding="utf-8")).get("sources") == sources_hash():
+        return True
+    logger.warning(
+        "Скомпилированные шаблоны устарели, используются исходники — выполните python templating.py",
+        extra={"directory": str(COMPILED_TEMPLATES_DIR)},
+    )
+    return False
+
+
+def build_environments(template_class=None):
+    """(обычное окружение, асинхронное окружение) с общими настройками."""
+    use_compiled = _compiled_is_current()
+    environments = []
+    for variant, enable_async in VARIANTS.items():
+        source_loader = FileSystemLoader(TEMPLATES_DIR)
+        loader = (
+            ChoiceLoader([ModuleLoader(str(COMPILED_TEMPLATES_DIR / variant)), source_loader])
+            if use_compiled else source_loader
+        )
+        env = Environment(loader=loader, autoescape=True, enable_async=enable_async)
+        # list_templates у ModuleLoader нет: перечисляем исходники
+        env.list_templates = source_loader.list_templates
+        if template_class is not None:
+            env.template_class = template_class
+        environments.append(env)
+    return tuple(environments)
+
+
+def compile_all():
+    for variant, enable_async in VARIANTS.items():
+        env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True, enable_async=enable_async)
+        target = COMPILED_TEMPLATES_DIR / variant
+        target.mkdir(parents=True, exist_ok=True)
+        for stale in target.glob("*.py"):
+            stale.unlink()
+        env.compile_templates(str(target), zip=None, ignore_errors=False)
+    (COMPILED_TEMPLATES_DIR / "manifest.json").write_text(
+        json.dumps({"sources": sources_hash()}), encoding="utf-8"
+    )
+    print(f"Шаблоны скомпилированы в {COMPILED_TEMPLATES_DIR}")
+
+
+if __name__ == "__main__":
+    compile_all()
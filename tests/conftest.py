@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# Настройки читаются при импорте модулей приложения — задаём их до импорта
+_database_dir = tempfile.TemporaryDirectory(prefix="tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_database_dir.name}/app.db"
+os.environ["DATABASE_READ_URL"] = os.environ["DATABASE_URL"]
+os.environ["INIT_LOCK_FILE"] = f"{_database_dir.name}/init.lock"
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Шаблоны и статика ищутся относительно текущего каталога
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """Один цикл событий на все тесты: пул соединений движка привязан к циклу."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    if "database" in sys.modules:
+        from database import engine, read_engine
+
+        loop.run_until_complete(engine.dispose())
+        if read_engine is not engine:
+            loop.run_until_complete(read_engine.dispose())
+    loop.close()
+    if "logs" in sys.modules:
+        sys.modules["logs"].stop_logging()
+
+
+@pytest.fixture
+def run(loop):
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def tmp_database_url(tmp_path):
+    return f"sqlite+aiosqlite:///{tmp_path}/test.db"
+
+
+_usernames = (f"user{n}" for n in itertools.count(1))
+
+
+@pytest.fixture(scope="session")
+def app(loop):
+    import main
+
+    loop.run_until_complete(main.init_db())
+    return main.app
+
+
+@pytest.fixture
+def make_client(app, loop):
+    """Клиент нового зарегистрированного пользователя: Bearer-заголовок для API и кука для страниц."""
+    import httpx
+
+    clients = []
+
+    async def register(username):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
+        clients.append(client)
+        response = await client.post("/api/v1/auth/register", json={"username": username, "password": "Password1"})
+        assert response.status_code == 200, response.text
+        response = await client.post("/api/v1/auth/token", data={"username": username, "password": "Password1"})
+        token = response.json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        client.cookies.set("access_token", f"Bearer {token}")
+        return client
+
+    def make(username=None):
+        return loop.run_until_complete(register(username or next(_usernames)))
+
+    yield make
+    for client in clients:
+        loop.run_until_complete(client.aclose())
@@ -0,0 +1,114 @@
+import bulk
+from bulk import iter_csv_rows, iter_lines
+
+HEADER = "foreign_word,native_word\n"
+
+
+async def _chunks(data: bytes, size: int = 7):
+    # Мелкие куски: строки и символы UTF-8 режутся на границах кусков
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def parse(run, text: str):
+    async def collect():
+        return [row async for row in iter_csv_rows(iter_lines(_chunks(text.encode("utf-8"))))]
+
+    return run(collect())
+
+
+def rows_of(parsed):
+    return [(line, row) for line, row in parsed if isinstance(row, dict)]
+
+
+def errors_of(parsed):
+    return [(line, str(row)) for line, row in parsed if isinstance(row, Exception)]
+
+
+def test_quoted_newlines_and_escaped_quotes(run):
+    parsed = parse(run, HEADER + '"multi\nline",a\n"say ""hi""",b\n')
+    assert rows_of(parsed) == [
+        (2, {"foreign_word": "multi\nline", "native_word": "a"}),
+        (4, {"foreign_word": 'say "hi"', "native_word": "b"}),
+    ]
+
+
+def test_stray_quote_inside_field(run):
+    parsed = parse(run, HEADER + '5" screen,экран\nnext,следующий\n')
+    assert rows_of(parsed) == [
+        (2, {"foreign_word": '5" screen', "native_word": "экран"}),
+        (3, {"foreign_word": "next", "native_word": "следующий"}),
+    ]
+    assert errors_of(parsed) == []
+
+
+def test_unterminated_quote_at_eof(run):
+    parsed = parse(run, HEADER + 'ok,хорошо\n"open,x\nlater,позже\nlast,последний')
+    assert errors_of(parsed) == [(3, "Незакрытая кавычка")]
+    # Строки, поглощённые незакрытой кавычкой, разбираются заново
+    assert [line for line, _ in rows_of(parsed)] == [2, 4, 5]
+
+
+def test_record_length_cap_skips_to_next_record(run, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_RECORD_LINES", 10)
+    body = HEADER + '"open,x\n' + "y\n" * 150 + "after,после\n"
+    parsed = parse(run, body)
+    # Одна ошибка на всю запись, а не по одной на каждую поглощённую строку
+    errors = errors_of(parsed)
+    assert len(errors) == 1 and errors[0][0] == 2
+    assert "слишком длинная" in errors[0][1]
+    assert rows_of(parsed) == [(153, {"foreign_word": "after", "native_word": "после"})]
+
+
+def test_record_length_cap_by_size(run, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_RECORD_CHARS", 100)
+    parsed = parse(run, HEADER + '"open,' + "x" * 200 + "\nmore\nafter,после\n")
+    assert len(errors_of(parsed)) == 1
+    assert rows_of(parsed) == [(4, {"foreign_word": "after", "native_word": "после"})]
+
+
+def test_crlf_and_bom(run):
+    parsed = parse(run, "﻿foreign_word,native_word\r\nhello,привет\r\n\"two\r\nlines\",b\r\n")
+    assert rows_of(parsed) == [
+        (2, {"foreign_word": "hello", "native_word": "привет"}),
+        (3, {"foreign_word": "two\nlines", "native_word": "b"}),
+    ]
+
+
+def post_csv(run, client, body: str, **params):
+    return run(client.post(
+        "/api/v1/flashcards/bulk", content=body.encode("utf-8"),
+        headers={"Content-Type": "text/csv"}, params=params,
+    ))
+
+
+def test_import_reports_row_errors(run, make_client):
+    client = make_client()
+    response = post_csv(run, client, HEADER + "hello,привет\n,пусто\n\"open,x\nworld,мир\n")
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert result["failed"] == 2
+    assert [error["row"] for error in result["errors"]] == [3, 4]
+    assert "foreign_word" in result["errors"][0]["errors"][0]
+    words = [card["foreign_word"] for card in run(client.get("/api/v1/flashcards/")).json()["items"]]
+    assert sorted(words) == ["hello", "world"]
+
+
+def test_import_rejects_bad_header(run, make_client):
+    client = make_client()
+    response = post_csv(run, client, "word,translation\nhello,привет\n")
+    assert response.status_code == 400
+    assert "foreign_word" in response.json()["detail"]
+    assert run(client.get("/api/v1/flashcards/")).json()["items"] == []
+
+
+def test_import_format_parameter(run, make_client):
+    client = make_client()
+    response = run(client.post(
+        "/api/v1/flashcards/bulk", params={"format": "ndjson"},
+        content='{"foreign_word": "hi", "native_word": "привет"}\n'.encode("utf-8"),
+    ))
+    assert response.json()["imported"] == 1
+    export = run(client.get("/api/v1/flashcards/export", params={"format": "ndjson"}))
+    assert export.headers["content-type"].startswith("application/x-ndjson")
@@ -0,0 +1,73 @@
+import main
+
+
+def create_card(run, client, word="etag"):
+    response = run(client.post("/api/v1/flashcards/", json={"foreign_word": word, "native_word": "метка"}))
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+def get_card(run, client, card_id, **headers):
+    return run(client.get(f"/api/v1/flashcards/{card_id}", headers=headers))
+
+
+def test_matching_etag_is_not_modified(run, make_client):
+    client = make_client()
+    card_id = create_card(run, client)
+    response = get_card(run, client, card_id)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    cached = get_card(run, client, card_id, **{"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+    # Слабое сравнение: совпадает и тег без префикса W/ в списке
+    strong = etag.removeprefix("W/")
+    assert get_card(run, client, card_id, **{"If-None-Match": f'"other", {strong}'}).status_code == 304
+    assert get_card(run, client, card_id, **{"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_none_match_star(run, make_client):
+    client = make_client()
+    card_id = create_card(run, client)
+    assert get_card(run, client, card_id, **{"If-None-Match": "*"}).status_code == 304
+    # Несуществующая карточка не должна выглядеть закэшированной
+    assert get_card(run, client, card_id + 10_000, **{"If-None-Match": "*"}).status_code == 404
+
+
+def test_etag_changes_after_update_and_delete(run, make_client):
+    client = make_client()
+    card_id = create_card(run, client)
+    other_id = create_card(run, client, "other")
+    first = get_card(run, client, card_id).headers["etag"]
+
+    response = run(client.put(f"/api/v1/flashcards/{card_id}", json={"native_word": "новая"}))
+    assert response.status_code == 200, response.text
+    updated = get_card(run, client, card_id, **{"If-None-Match": first})
+    assert updated.status_code == 200
+    assert updated.json()["native_word"] == "новая"
+    assert updated.headers["etag"] != first
+
+    # Удаление меняет версию коллекции — и ETag остальных карточек тоже
+    before_delete = get_card(run, client, other_id).headers["etag"]
+    assert run(client.delete(f"/api/v1/flashcards/{card_id}")).status_code == 204
+    assert get_card(run, client, card_id, **{"If-None-Match": updated.headers["etag"]}).status_code == 404
+    after_delete = get_card(run, client, other_id, **{"If-None-Match": before_delete})
+    assert after_delete.status_code == 200
+    assert after_delete.headers["etag"] != before_delete
+
+
+def test_dashboard_etag_depends_on_templates(run, make_client, monkeypatch):
+    client = make_client()
+    create_card(run, client)
+    response = run(client.get("/dashboard"))
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert run(client.get("/dashboard", headers={"If-None-Match": etag})).status_code == 304
+
+    # Новый деплой с другими шаблонами: старый HTML через 304 не отдаётся
+    monkeypatch.setattr(main, "TEMPLATES_VERSION", "0" * 12)
+    response = run(client.get("/dashboard", headers={"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -0,0 +1,104 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, insert, inspect, text,
+)
+from database import create_engine_from_url
+from migrations import MIGRATIONS, applied_versions, upgrade, verify
+
+# Схема до появления миграций: только users и flashcards без новых столбцов
+baseline = MetaData()
+Table(
+    "users", baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("is_superuser", Boolean, default=False),
+)
+Table(
+    "flashcards", baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("foreign_word", String(100), index=True),
+    Column("native_word", String(100)),
+    Column("example", String(500), nullable=True),
+    Column("is_learned", Boolean, default=False),
+    Column("repetitions", Integer, default=0),
+    Column("last_reviewed", DateTime, nullable=True),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime, default=datetime.utcnow),
+)
+
+ALL_VERSIONS = [migration.version for migration in MIGRATIONS]
+
+
+@pytest.fixture
+def engine(run, tmp_database_url):
+    engine = create_engine_from_url(tmp_database_url)
+    yield engine
+    run(engine.dispose())
+
+
+async def create_baseline(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(baseline.create_all)
+        users, flashcards = baseline.tables["users"], baseline.tables["flashcards"]
+        await conn.execute(insert(users), [
+            {"id": 1, "username": "alice", "hashed_password": "x"},
+            {"id": 2, "username": "bob", "hashed_password": "x"},
+        ])
+        await conn.execute(insert(flashcards), [
+            {"foreign_word": f"word{i}", "native_word": "слово", "owner_id": 1 + i % 2,
+             "is_learned": False, "repetitions": 0, "created_at": datetime(2024, 1, 1)}
+            for i in range(7)
+        ])
+
+
+def test_baseline_upgrade_verify(run, engine):
+    run(create_baseline(engine))
+    problems = run(verify(engine))
+    assert any("change_seq" in problem for problem in problems)
+    assert any("0001" in problem for problem in problems)
+
+    assert run(upgrade(engine)) == ALL_VERSIONS
+    assert run(verify(engine)) == []
+
+    async def check_data():
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text("SELECT owner_id, change_seq, due_at FROM flashcards"))).all()
+            indexes = await conn.run_sync(
+                lambda sync_conn: {index["name"] for index in inspect(sync_conn).get_indexes("flashcards")}
+            )
+        return rows, indexes
+
+    rows, indexes = run(check_data())
+    assert len(rows) == 7
+    assert all(due_at is not None for _, _, due_at in rows)
+    # Номера изменений уникальны в пределах владельца и начинаются с 1
+    for owner_id in (1, 2):
+        seqs = sorted(seq for owner, seq, _ in rows if owner == owner_id)
+        assert seqs == list(range(1, len(seqs) + 1))
+    assert "ix_flashcards_owner_id_is_learned" in indexes
+
+
+def test_upgrade_is_idempotent(run, engine):
+    run(create_baseline(engine))
+    run(upgrade(engine))
+    assert run(upgrade(engine)) == []
+    assert set(run(applied_versions(engine))) == set(ALL_VERSIONS)
+
+
+def test_fresh_database(run, engine):
+    # На пустой базе create_all создаёт всё сразу, миграции только отмечаются
+    assert run(upgrade(engine)) == ALL_VERSIONS
+    assert run(verify(engine)) == []
+
+
+def test_verify_does_not_modify_database(run, engine):
+    run(create_baseline(engine))
+    run(verify(engine))
+
+    async def tables():
+        async with engine.connect() as conn:
+            return await conn.run_sync(lambda sync_conn: set(inspect(sync_conn).get_table_names()))
+
+    assert run(tables()) == {"users", "flashcards"}
@@ -0,0 +1,103 @@
+"""Число SQL-запросов на горячих путях: N+1 или лишний запрос роняют тест.
+
+Клиент — httpx.AsyncClient с ASGITransport: приложение работает в том же
+контексте, что и тест, поэтому count_queries видит запросы обработчика.
+"""
+import httpx
+import pytest
+import main
+from instrumentation import QueryCountExceeded, count_queries
+
+CARDS = 30
+
+
+@pytest.fixture(scope="module")
+def client(loop):
+    async def setup():
+        await main.init_db()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+        response = await client.post("/api/v1/auth/register", json={"username": "budget", "password": "Password1"})
+        assert response.status_code == 200, response.text
+        response = await client.post("/api/v1/auth/token", data={"username": "budget", "password": "Password1"})
+        token = response.json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        client.cookies.set("access_token", f"Bearer {token}")
+        for i in range(CARDS):
+            response = await client.post("/api/v1/flashcards/", json={"foreign_word": f"word{i}", "native_word": "слово"})
+            assert response.status_code in (200, 201), response.text
+        return client
+
+    client = loop.run_until_complete(setup())
+    yield client
+    loop.run_until_complete(client.aclose())
+
+
+def get(run, client, url, budget, **kwargs):
+    async def request():
+        with count_queries(budget=budget) as stats:
+            response = await client.get(url, **kwargs)
+        return response, stats
+
+    response, stats = run(request())
+    assert response.status_code == 200, response.text
+    assert not stats.duplicates(), stats.duplicates()
+    return response, stats
+
+
+def test_api_list(run, client):
+    # Версия коллекции и страница карточек; пользователь — из кэша
+    response, _ = get(run, client, "/api/v1/flashcards/", budget=2)
+    assert len(response.json()["items"]) == CARDS
+
+
+def test_api_list_not_modified(run, client):
+    response, _ = get(run, client, "/api/v1/flashcards/", budget=2)
+
+    async def revalidate():
+        # 304 отдаётся по одной версии коллекции
+        with count_queries(budget=1):
+            return await client.get("/api/v1/flashcards/", headers={"If-None-Match": response.headers["etag"]})
+
+    assert run(revalidate()).status_code == 304
+
+
+@pytest.mark.parametrize("url", ["/dashboard", "/dashboard?all=1"])
+def test_dashboard(run, client, url):
+    # Первый рендер заполняет кэш фрагментов (плюс запрос статистики), второй — из кэша
+    get(run, client, url, budget=3)
+    response, _ = get(run, client, url, budget=2)
+    assert "word0" in response.text
+
+
+def test_budget_is_enforced(run, client):
+    with pytest.raises(QueryCountExceeded):
+        get(run, client, "/api/v1/flashcards/", budget=1)
+
+
+
+@pytest.fixture(scope="module")
+def admin(loop, client):
+    async def setup():
+        admin = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+        response = await admin.post("/admin/login", data={"username": "admin", "password": "admin123"})
+        assert response.status_code in (200, 302), response.text
+        # Первый запрос монтирует админку и кэширует пользователя
+        assert (await admin.get("/admin/flashcard/list")).status_code == 200
+        return admin
+
+    admin = loop.run_until_complete(setup())
+    yield admin
+    loop.run_until_complete(admin.aclose())
+
+
+def test_admin_list(run, admin):
+    # Число карточек и страница с владельцами одним JOIN, без запроса на строку
+    response, _ = get(run, admin, "/admin/flashcard/list", budget=2, params={"pageSize": 100})
+    assert "word0" in response.text
+
+
+def test_admin_details(run, client, admin):
+    card_id = run(client.get("/api/v1/flashcards/")).json()["items"][0]["id"]
+    response, _ = get(run, admin, f"/admin/flashcard/details/{card_id}", budget=1)
+    # Ссылка на владельца строится из уже загруженного JOIN-ом объекта
+    assert "/admin/user/details/" in response.text
@@ -0,0 +1,71 @@
+import pytest
+import ratelimit
+from ratelimit import MemoryBackend, RateLimitBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_then_refill(run, clock):
+    backend = MemoryBackend()
+    # 2 токена, пополнение — 1 в секунду
+    assert run(backend.take("k", 2, 1.0)) == 0
+    assert run(backend.take("k", 2, 1.0)) == 0
+    assert run(backend.take("k", 2, 1.0)) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert run(backend.take("k", 2, 1.0)) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert run(backend.take("k", 2, 1.0)) == 0
+    # Запас не копится сверх ёмкости
+    clock.now += 100
+    assert run(backend.take("k", 2, 1.0)) == 0
+    assert run(backend.take("k", 2, 1.0)) == 0
+    assert run(backend.take("k", 2, 1.0)) > 0
+
+
+def test_keys_are_independent(run, clock):
+    backend = MemoryBackend()
+    assert run(backend.take("a", 1, 1.0)) == 0
+    assert run(backend.take("a", 1, 1.0)) > 0
+    assert run(backend.take("b", 1, 1.0)) == 0
+
+
+def test_evicts_refilled_buckets(run, clock):
+    backend = MemoryBackend(evict_interval=10)
+    run(backend.take("slow", 5, 0.1))
+    run(backend.take("fast", 5, 10.0))
+    clock.now += 1
+    backend.evict()
+    # fast уже снова полная и удалена; slow ещё пополняется
+    assert list(backend.buckets) == ["slow"]
+    clock.now += 100
+    run(backend.take("other", 5, 1.0))
+    # Плановая очистка при обращении после evict_interval
+    assert list(backend.buckets) == ["other"]
+
+
+def test_max_keys_drops_least_recent(run, clock):
+    backend = MemoryBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        run(backend.take(key, 5, 1.0))
+    assert list(backend.buckets) == ["b", "c"]
+
+
+def test_backend_must_implement_take():
+    class Incomplete(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
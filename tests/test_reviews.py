@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+
+def create_card(run, client, word):
+    response = run(client.post("/api/v1/flashcards/", json={"foreign_word": word, "native_word": "повтор"}))
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+def submit(run, client, reviews):
+    return run(client.post("/api/v1/flashcards/reviews", json=reviews))
+
+
+def test_sm2_schedule(run, make_client):
+    client = make_client()
+    card_id = create_card(run, client, "review")
+    first = datetime(2026, 1, 10, 9, 0)
+    second = first + timedelta(days=1)
+    # Пачка не по порядку: повторения одной карточки применяются хронологически
+    response = submit(run, client, [
+        {"card_id": card_id, "grade": 4, "reviewed_at": second.isoformat() + "Z"},
+        {"card_id": card_id, "grade": 5, "reviewed_at": first.isoformat() + "Z"},
+    ])
+    assert response.status_code == 200, response.text
+    [card] = response.json()
+    assert card["repetitions"] == 2
+    assert card["interval_days"] == 6
+    assert datetime.fromisoformat(card["last_reviewed"]) == second
+    assert datetime.fromisoformat(card["due_at"]) == second + timedelta(days=6)
+    # 2.5 + 0.1 после оценки 5, затем без изменений после оценки 4
+    assert abs(card["ease_factor"] - 2.6) < 1e-9
+
+    # Забытая карточка начинает интервалы сначала
+    third = second + timedelta(days=6)
+    [card] = submit(run, client, [{"card_id": card_id, "grade": 1, "reviewed_at": third.isoformat()}]).json()
+    assert card["interval_days"] == 1
+    assert datetime.fromisoformat(card["due_at"]) == third + timedelta(days=1)
+
+
+def test_foreign_card_rejects_whole_batch(run, make_client):
+    owner, stranger = make_client(), make_client()
+    own_id = create_card(run, owner, "mine")
+    foreign_id = create_card(run, stranger, "theirs")
+
+    response = submit(run, owner, [
+        {"card_id": own_id, "grade": 5},
+        {"card_id": foreign_id, "grade": 5},
+    ])
+    assert response.status_code == 404
+    assert str(foreign_id) in response.json()["detail"]
+
+    # Своя карточка из отклонённой пачки не изменилась
+    changes = run(owner.get("/api/v1/flashcards/changes")).json()
+    [own] = [item for item in changes["upserted"] if item["id"] == own_id]
+    assert own["repetitions"] == 0
+    assert own["last_reviewed"] is None
+
+
+def test_empty_batch(run, make_client):
+    client = make_client()
+    assert submit(run, client, []).status_code == 422
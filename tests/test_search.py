@@ -0,0 +1,79 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import search
+from database import Base
+from models import Flashcard, User
+
+# Индекс в том виде, в каком его создавали до появления столбца owner
+LEGACY_DDL = [
+    """
+    CREATE VIRTUAL TABLE flashcards_fts USING fts5(
+        foreign_word, native_word, example,
+        content='flashcards', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER flashcards_fts_ai AFTER INSERT ON flashcards BEGIN
+        INSERT INTO flashcards_fts(rowid, foreign_word, native_word, example)
+        VALUES (new.id, new.foreign_word, new.native_word, new.example);
+    END
+    """,
+]
+
+
+def test_search_is_limited_to_owner(run, make_client):
+    alice, bob = make_client(), make_client()
+
+    async def scenario():
+        response = await alice.post("/api/v1/flashcards/", json={"foreign_word": "quokka", "native_word": "квокка"})
+        assert response.status_code in (200, 201), response.text
+        own = await alice.get("/api/v1/flashcards/search", params={"q": "quokka"})
+        foreign = await bob.get("/api/v1/flashcards/search", params={"q": "quokka"})
+        return own, foreign
+
+    own, foreign = run(scenario())
+    assert [card["foreign_word"] for card in own.json()] == ["quokka"]
+    assert foreign.status_code == 200
+    assert foreign.json() == []
+
+
+def test_legacy_index_is_rebuilt_with_owner(run, tmp_database_url):
+    engine = create_async_engine(tmp_database_url)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for statement in LEGACY_DDL:
+                await conn.execute(text(statement))
+        async with sessions() as db:
+            alice = User(username="alice", hashed_password="x")
+            bob = User(username="bob", hashed_password="x")
+            db.add_all([alice, bob])
+            await db.flush()
+            db.add_all([
+                Flashcard(foreign_word="quokka", native_word="квокка", owner_id=alice.id),
+                Flashcard(foreign_word="quokkas", native_word="квокки", owner_id=bob.id),
+            ])
+            await db.commit()
+
+        async with engine.begin() as conn:
+            await conn.run_sync(search.setup_search)
+            sql = (await conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'flashcards_fts'")
+            )).scalar()
+
+        async with sessions() as db:
+            # Карточки, созданные до пересоздания, попадают в новый индекс
+            found = await search.search_flashcards(db, alice.id, "quokka", 10)
+            # Новые карточки индексируются уже с владельцем
+            db.add(Flashcard(foreign_word="quokka tail", native_word="хвост", owner_id=bob.id))
+            await db.commit()
+            found_bob = await search.search_flashcards(db, bob.id, "quokka", 10)
+        await engine.dispose()
+        return sql, alice.id, found, found_bob
+
+    sql, alice_id, found, found_bob = run(scenario())
+    assert "owner" in sql
+    assert [(card.foreign_word, card.owner_id) for card in found] == [("quokka", alice_id)]
+    assert {card.foreign_word for card in found_bob} == {"quokkas", "quokka tail"}
@@ -0,0 +1,43 @@
+from sqlalchemy import select
+import stats
+from database import SessionLocal
+from models import FlashcardStats, User
+
+
+def test_counters_match_aggregate(run, make_client, monkeypatch):
+    monkeypatch.setattr(stats, "FLASHCARD_STATS_COUNTERS", True)
+    client = make_client("stats_counters")
+
+    async def scenario():
+        ids = []
+        for i in range(4):
+            response = await client.post("/api/v1/flashcards/", json={"foreign_word": f"count{i}", "native_word": "счёт"})
+            assert response.status_code in (200, 201), response.text
+            ids.append(response.json()["id"])
+        for card_id in ids[:3]:
+            response = await client.post(f"/web/flashcards/{card_id}/mark-learned", follow_redirects=False)
+            assert response.status_code in (200, 303), response.text
+        # Снятие отметки уменьшает learned
+        await client.post(f"/web/flashcards/{ids[2]}/mark-learned", follow_redirects=False)
+        # Удаление выученной карточки и карточки в процессе
+        assert (await client.delete(f"/api/v1/flashcards/{ids[0]}")).status_code == 204
+        response = await client.post(f"/web/flashcards/{ids[3]}/delete", follow_redirects=False)
+        assert response.status_code in (200, 303), response.text
+        response = await client.post(
+            "/api/v1/flashcards/bulk",
+            content="foreign_word,native_word\nbulk1,один\nbulk2,два\n,пусто\n",
+            headers={"Content-Type": "text/csv"},
+        )
+        assert response.json()["imported"] == 2, response.text
+
+        api_stats = (await client.get("/api/v1/flashcards/stats")).json()
+        async with SessionLocal() as db:
+            user_id = await db.scalar(select(User.id).where(User.username == "stats_counters"))
+            row = await db.get(FlashcardStats, user_id)
+            aggregate = await stats.aggregate_flashcard_stats(db, user_id)
+        return api_stats, row, aggregate
+
+    api_stats, row, aggregate = run(scenario())
+    assert row is not None
+    assert (row.total, row.learned) == (aggregate["total"], aggregate["learned"])
+    assert api_stats == aggregate == {"total": 4, "learned": 1, "in_progress": 3}
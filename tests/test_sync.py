@@ -0,0 +1,95 @@
+import pytest
+
+
+@pytest.fixture
+def history(run, make_client):
+    """Пять карточек (номера изменений 1–5), правка первой (6) и удаление второй (7)."""
+    client = make_client()
+
+    async def setup():
+        ids = []
+        for i in range(5):
+            response = await client.post("/api/v1/flashcards/", json={"foreign_word": f"sync{i}", "native_word": "синхр"})
+            assert response.status_code in (200, 201), response.text
+            ids.append(response.json()["id"])
+        response = await client.put(f"/api/v1/flashcards/{ids[0]}", json={"native_word": "изменено"})
+        assert response.status_code == 200, response.text
+        assert (await client.delete(f"/api/v1/flashcards/{ids[1]}")).status_code == 204
+        return ids
+
+    return client, run(setup())
+
+
+def changes(run, client, since=0, limit=None):
+    params = {"since": since}
+    if limit is not None:
+        params["limit"] = limit
+    response = run(client.get("/api/v1/flashcards/changes", params=params))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def sequence(page):
+    return sorted(
+        [card["change_seq"] for card in page["upserted"]] + [row["change_seq"] for row in page["deleted"]]
+    )
+
+
+def test_pages_are_monotonic(run, history):
+    client, ids = history
+    since, seen, upserted, deleted = 0, [], [], []
+    while True:
+        page = changes(run, client, since, limit=2)
+        seqs = sequence(page)
+        assert len(seqs) <= 2
+        assert all(seq > since for seq in seqs)
+        assert page["cursor"] == (seqs[-1] if seqs else since)
+        seen += seqs
+        upserted += page["upserted"]
+        deleted += page["deleted"]
+        since = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert seen == list(range(3, 8))
+    # Правленая карточка отдаётся один раз, с последним номером и новым значением
+    by_id = {card["id"]: card for card in upserted}
+    assert len(by_id) == len(upserted)
+    assert sorted(by_id) == sorted([ids[0], *ids[2:]])
+    assert by_id[ids[0]]["change_seq"] == 6
+    assert by_id[ids[0]]["native_word"] == "изменено"
+
+
+def test_deleted_cards_are_tombstones(run, history):
+    client, ids = history
+    page = changes(run, client)
+    assert page["deleted"] == [{"id": ids[1], "change_seq": 7}]
+    assert ids[1] not in {card["id"] for card in page["upserted"]}
+    # Клиент, синхронизированный до удаления, получает только tombstone
+    page = changes(run, client, since=6)
+    assert page["upserted"] == []
+    assert page["deleted"] == [{"id": ids[1], "change_seq": 7}]
+    assert page["cursor"] == 7
+
+
+@pytest.mark.parametrize("since", [7, 100])
+def test_since_at_or_past_head(run, history, since):
+    client, _ = history
+    page = changes(run, client, since)
+    assert page == {"upserted": [], "deleted": [], "cursor": since, "has_more": False}
+
+
+def test_limit_boundary(run, history):
+    client, _ = history
+    # Всего пять актуальных изменений: 3, 4, 5, 6 и tombstone 7
+    exact = changes(run, client, limit=5)
+    assert sequence(exact) == [3, 4, 5, 6, 7]
+    assert exact["has_more"] is False
+
+    short = changes(run, client, limit=4)
+    assert sequence(short) == [3, 4, 5, 6]
+    assert short["cursor"] == 6
+    assert short["has_more"] is True
+
+    rest = changes(run, client, since=short["cursor"], limit=1)
+    assert sequence(rest) == [7]
+    assert rest["has_more"] is False
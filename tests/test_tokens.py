@@ -0,0 +1,51 @@
+from datetime import timedelta
+import pytest
+from tokens import TokenError, TokenExpired, TokenVerifier
+
+
+def test_issued_token_verifies_and_is_cached():
+    verifier = TokenVerifier({"k1": "secret-1"})
+    token = verifier.issue({"sub": "alice"})
+    assert verifier.verify(token)["sub"] == "alice"
+    assert verifier.verify(token)["sub"] == "alice"
+    assert verifier.cache.hits == 1
+
+
+def test_expired_token():
+    verifier = TokenVerifier({"k1": "secret-1"})
+    token = verifier.issue({"sub": "alice"}, expires_delta=timedelta(seconds=-10))
+    with pytest.raises(TokenExpired):
+        verifier.verify(token)
+
+
+def test_unknown_kid():
+    old = TokenVerifier({"k1": "secret-1"}).issue({"sub": "alice"})
+    with pytest.raises(TokenError, match="k1"):
+        TokenVerifier({"k2": "secret-2"}).verify(old)
+
+
+def test_rotated_key_still_accepted():
+    old = TokenVerifier({"k1": "secret-1"}).issue({"sub": "alice"})
+    # Первый ключ — активный, прежние остаются для проверки
+    rotated = TokenVerifier({"k2": "secret-2", "k1": "secret-1"})
+    assert rotated.verify(old)["sub"] == "alice"
+
+
+def test_wrong_type():
+    verifier = TokenVerifier({"k1": "secret-1"})
+    refresh = verifier.issue({"sub": "alice"}, "refresh", timedelta(days=1))
+    with pytest.raises(TokenError):
+        verifier.verify(refresh)
+    assert verifier.verify(refresh, "refresh")["sub"] == "alice"
+    # Из кэша тип тоже проверяется
+    with pytest.raises(TokenError):
+        verifier.verify(refresh)
+
+
+def test_tampered_signature():
+    verifier = TokenVerifier({"k1": "secret-1"})
+    token = verifier.issue({"sub": "alice"})
+    with pytest.raises(TokenError):
+        TokenVerifier({"k1": "other"}).verify(token)
+    with pytest.raises(TokenError):
+        verifier.verify("not-a-token")
@@ -0,0 +1,31 @@
+FRAGMENT = {"Accept": "application/json"}
+
+
+def create_card(run, client):
+    response = run(client.post("/api/v1/flashcards/", json={"foreign_word": "web", "native_word": "веб"}))
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+def test_update_missing_fields_fragment(run, make_client):
+    client = make_client()
+    card_id = create_card(run, client)
+    response = run(client.post(f"/web/flashcards/{card_id}/update", data={"foreign_word": "web"}, headers=FRAGMENT))
+    assert response.status_code == 400
+    assert response.json() == {"error": "Иностранное слово и перевод обязательны"}
+
+
+def test_update_missing_fields_page(run, make_client):
+    client = make_client()
+    card_id = create_card(run, client)
+    response = run(client.post(f"/web/flashcards/{card_id}/update", data={"foreign_word": "web"}))
+    assert response.status_code == 400
+    assert response.headers["content-type"].startswith("text/html")
+    assert "Иностранное слово и перевод обязательны" in response.text
+
+
+def test_create_missing_fields_fragment(run, make_client):
+    client = make_client()
+    response = run(client.post("/web/flashcards", data={"native_word": "веб"}, headers=FRAGMENT))
+    assert response.status_code == 400
+    assert response.json() == {"error": "Иностранное слово и перевод обязательны"}
@@ -0,0 +1,107 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from cache import TTLCache
+
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Refresh-токен позволяет продлить сессию без повторного входа (и bcrypt)
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+# Кэш проверенных токенов: повторная проверка того же токена — поиск в словаре
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+
+DEFAULT_SECRET_KEY = "your-very-secret-jwt-key-change-in-production"
+
+
+class TokenError(Exception):
+    """Токен недействителен: подпись, формат, неизвестный ключ или не тот тип."""
+
+
+class TokenExpired(TokenError):
+    pass
+
+
+def load_keys(raw: Optional[str]) -> dict:
+    """Разбирает JWT_KEYS вида "kid1:secret1,kid2:secret2".
+
+    Новые токены подписываются первым ключом, принимаются токены любого из
+    перечисленных: для ротации новый ключ ставится первым, а старый остаётся
+    в списке, пока не истекут выданные им refresh-токены.
+    """
+    if not raw:
+        return {"default": DEFAULT_SECRET_KEY}
+    keys = {}
+    for item in raw.split(","):
+        kid, _, secret = item.strip().partition(":")
+        if not kid or not secret:
+            raise ValueError("JWT_KEYS: ожидается список kid:secret через запятую")
+        keys[kid] = secret
+    return keys
+
+
+class TokenVerifier:
+    """Выпуск и проверка JWT с ротацией ключей по kid и кэшем проверенных claims.
+
+    Запись в кэше живёт не дольше exp токена, поэтому просроченный токен
+    из кэша не достаётся. Возвращаемый dict общий для всех запросов — не изменяйте его.
+    """
+
+    def __init__(self, keys: dict, algorithm: str = ALGORITHM,
+                 cache_size: int = TOKEN_CACHE_SIZE, cache_ttl: float = TOKEN_CACHE_TTL):
+        if not keys:
+            raise ValueError("Нужен хотя бы один ключ подписи")
+        self.keys = dict(keys)
+        self.active_kid = next(iter(self.keys))
+        self.algorithm = algorithm
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def issue(self, claims: dict, token_type: str = "access", expires_delta: Optional[timedelta] = None) -> str:
+        if expires_delta is None:
+            expires_delta = (
+                timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS) if token_type == "refresh"
+                else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            )
+        to_encode = dict(claims, type=token_type, exp=datetime.utcnow() + expires_delta)
+        from jose import jwt
+
+        return jwt.encode(
+            to_encode, self.keys[self.active_kid], algorithm=self.algorithm,
+            headers={"kid": self.active_kid},
+        )
+
+    def verify(self, token: str, token_type: str = "access") -> dict:
+        """Возвращает claims токена; бросает TokenError, если токен недействителен.
+
+        При попадании в кэш python-jose не нужен вовсе: он импортируется
+        при первой настоящей проверке, а не при старте процесса.
+        """
+        claims = self.cache.get(token)
+        if claims is None:
+            claims = self._decode(token)
+            exp = claims.get("exp")
+            self.cache.set(token, claims, ttl=exp - time.time() if exp else None)
+        # Токены без type выпущены до появления refresh-токенов и считаются access
+        if claims.get("type", "access") != token_type:
+            raise TokenError(f"Ожидался {token_type}-токен")
+        return claims
+
+    def _decode(self, token: str) -> dict:
+        from jose import jwt, ExpiredSignatureError, JWTError
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            # Токены без kid подписаны до ротации ключей — проверяем активным ключом
+            key = self.keys.get(kid if kid is not None else self.active_kid)
+            if key is None:
+                raise TokenError(f"Неизвестный ключ подписи: {kid}")
+            return jwt.decode(token, key, algorithms=[self.algorithm])
+        except ExpiredSignatureError as e:
+            raise TokenExpired(str(e)) from e
+        except JWTError as e:
+            raise TokenError(str(e)) from e
+
+
+token_verifier = TokenVerifier(load_keys(os.getenv("JWT_KEYS")))
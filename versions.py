@@ -0,0 +1,101 @@
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import upsert
+from models import Flashcard, FlashcardTombstone, FlashcardVersion
+
+CollectionVersion = namedtuple("CollectionVersion", ["version", "updated_at"])
+
+# Клиент может хранить ответ, но обязан перепроверять его через ETag
+CACHE_CONTROL = "private, no-cache"
+
+
+async def get_collection_version(db: AsyncSession, owner_id: int) -> CollectionVersion:
+    """Читает версию коллекции по первичному ключу — таблицу flashcards не трогает."""
+    result = await db.execute(
+        select(FlashcardVersion.version, FlashcardVersion.updated_at)
+        .where(FlashcardVersion.user_id == owner_id)
+    )
+    row = result.first()
+    if row is None:
+        return CollectionVersion(0, None)
+    return CollectionVersion(row.version, row.updated_at)
+
+
+async def bump_collection_version(db: AsyncSession, owner_id: int, count: int = 1) -> int:
+    """Увеличивает версию коллекции на count в текущей транзакции и возвращает новое значение.
+
+    Версия служит и последовательностью изменений: номера
+    version - count + 1 .. version можно раздать изменённым строкам.
+    """
+    now = datetime.utcnow()
+    # Одним запросом: при первых изменениях из двух запросов сразу оба INSERT не упадут на ключе
+    statement = upsert(db, FlashcardVersion).values(user_id=owner_id, version=count, updated_at=now)
+    result = await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[FlashcardVersion.user_id],
+            set_={"version": FlashcardVersion.version + count, "updated_at": now},
+        )
+        .returning(FlashcardVersion.version)
+    )
+    return result.scalar_one()
+
+
+async def mark_changed(db: AsyncSession, card: Flashcard) -> int:
+    """Присваивает созданной или изменённой карточке следующий номер изменения."""
+    card.change_seq = await bump_collection_version(db, card.owner_id)
+    return card.change_seq
+
+
+async def record_deletion(db: AsyncSession, card: Flashcard, owner_id: Optional[int] = None) -> int:
+    """Оставляет tombstone вместо удалённой карточки (или карточки, ушедшей к другому владельцу)."""
+    owner_id = card.owner_id if owner_id is None else owner_id
+    change_seq = await bump_collection_version(db, owner_id)
+    db.add(FlashcardTombstone(owner_id=owner_id, card_id=card.id, change_seq=change_seq))
+    return change_seq
+
+
+def make_etag(owner_id: int, version: int, variant: str = "") -> str:
+    """Слабый ETag: версия коллекции плюс хеш того, что именно отдаётся (страница, карточка)."""
+    return f'W/"u{owner_id}-v{version}-{zlib.crc32(variant.encode("utf-8")):08x}"'
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime], exists: bool = True) -> bool:
+    """exists=False — ресурс ещё не найден (проверка до запроса к базе):
+    If-None-Match: * тогда не совпадает, иначе 304 получил бы и несуществующий ресурс."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match приоритетнее If-Modified-Since; сравнение слабое — без префикса W/
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return ("*" in tags and exists) or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if last_modified is not None:
+        response.headers["Last-Modified"] = _http_date(last_modified)
+    return response
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    return set_validators(Response(status_code=304), etag, last_modified)